@@ -0,0 +1,95 @@
+"""
+File containing a thin layer over the Z3 C API, used by TimetableScheduler to build the X/Y model. The Python API checks
+and coerces every argument of Not, And, Or, Implies, AtMost and AtLeast and wraps every intermediate term in a Python
+object; the model only combines Boolean variables, so these functions call the C API directly on the raw ASTs and never
+wrap the intermediate terms. This makes the construction much faster, not smaller: the variables are still BoolRef
+objects with a formatted name each (the model cache, the DIMACS export and diagnose() read the names back), and the
+tables of raw ASTs (and the negations cached for the pairwise encoding) add to the Python heap while the constraints are
+built. `python benchmark.py build` measures both.
+"""
+
+from typing import Dict, Iterable, List
+from z3 import BoolRef, BoolSort, Context, ExprRef
+from z3.z3core import (Z3_dec_ref, Z3_inc_ref, Z3_mk_and, Z3_mk_atleast, Z3_mk_atmost, Z3_mk_const, Z3_mk_implies,
+                       Z3_mk_not, Z3_mk_or, Z3_mk_string_symbol, Z3_optimize_assert, Z3_solver_assert)
+from z3.z3types import Ast
+
+class Builder:
+    """Builds Boolean terms as raw ASTs (z3.z3types.Ast) of a context. Z3 frees an unreferenced result at the next call
+    of the API, so every term built here holds a reference until .release(), to be called once the constraint made of
+    the terms is asserted (see .add()). The negations built by .negations() are held until .release(True)."""
+
+    def __init__(self, ctx: Context):
+        self.ctx = ctx
+        self.ref = ctx.ref()
+        self.bool = BoolSort(ctx).ast
+        self.held = [] # terms holding a reference, see .release()
+        self.kept = [] # negations holding a reference, see .negations()
+
+    def variables(self, names: Iterable[str]) -> List[BoolRef]:
+        """Create one Boolean variable per name (the same as Bool(name), without its checks)."""
+        (ref, bool, ctx) = (self.ref, self.bool, self.ctx)
+        return [BoolRef(Z3_mk_const(ref, Z3_mk_string_symbol(ref, name), bool), ctx) for name in names]
+
+    def raw(self, variables: Dict) -> Dict:
+        """Return the raw ASTs of a dictionary of variables, under the same keys."""
+        return {k: v.as_ast() for (k, v) in variables.items()}
+
+    def negations(self, variables: Dict) -> Dict:
+        """Return the raw negations of a dictionary of variables, under the same keys, so that every negation is built
+        once instead of once per constraint mentioning it."""
+        negations = {k: self.not_(v.as_ast()) for (k, v) in variables.items()}
+        (self.kept, self.held) = (self.kept + self.held, [])
+        return negations
+
+    def hold(self, a: Ast) -> Ast:
+        """Take a reference to a term until .release()."""
+        Z3_inc_ref(self.ref, a)
+        self.held.append(a)
+        return a
+
+    def release(self, negations = False):
+        """Drop the references held by the terms built so far (and by the negations, if negations is True); the asserted
+        terms stay alive in the solver."""
+        for a in self.held + (self.kept if negations else []):
+            Z3_dec_ref(self.ref, a)
+        self.held = []
+        if negations:
+            self.kept = []
+
+    def array(self, terms: List[Ast]):
+        """Return terms as a C array of ASTs."""
+        return (Ast * len(terms))(*terms)
+
+    def not_(self, a: Ast) -> Ast:
+        return self.hold(Z3_mk_not(self.ref, a))
+
+    def and_(self, terms: List[Ast]) -> Ast:
+        return self.hold(Z3_mk_and(self.ref, len(terms), self.array(terms)))
+
+    def or_(self, terms: List[Ast]) -> Ast:
+        return self.hold(Z3_mk_or(self.ref, len(terms), self.array(terms)))
+
+    def implies(self, a: Ast, b: Ast) -> Ast:
+        return self.hold(Z3_mk_implies(self.ref, a, b))
+
+    def atmost(self, terms: List[Ast], k: int) -> Ast:
+        return self.hold(Z3_mk_atmost(self.ref, len(terms), self.array(terms), k))
+
+    def atleast(self, terms: List[Ast], k: int) -> Ast:
+        return self.hold(Z3_mk_atleast(self.ref, len(terms), self.array(terms), k))
+
+    def wrap(self, a) -> BoolRef:
+        """Return a term as a BoolRef of the Python API (terms of the Python API are returned as they are)."""
+        return a if isinstance(a, ExprRef) else BoolRef(a, self.ctx)
+
+    def add(self, solver, a):
+        """Assert a term on a Solver or an Optimize, skipping the checks of solver.add, and release the terms it is
+        made of."""
+        if isinstance(a, ExprRef):
+            a = a.as_ast()
+        if hasattr(solver, 'optimize'):
+            Z3_optimize_assert(self.ref, solver.optimize, a)
+        else:
+            Z3_solver_assert(self.ref, solver.solver, a)
+        self.release()
@@ -0,0 +1,369 @@
+"""
+File containing the benchmarks of the model: a comparison of the engines on the shipped databases and a suite on
+synthetic instances of configurable size, whose reports can be compared between commits.
+Run it from the root of the repo with `python benchmark.py` (engines), `python benchmark.py suite` (synthetic suite) or
+`python benchmark.py sat [solver ...]` (SMT against pure SAT), `python benchmark.py availability` (with and without the
+availability calendars) or `python benchmark.py build` (time and Python heap of the construction of the model).
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3 as sq3
+import subprocess
+import sys
+import time
+import tracemalloc
+from model import TimetableScheduler
+
+# (database, timeslots_per_day, t_start), as in demo.ipynb
+DATABASES = [('sample_1', 5, 3), ('aida', 9, 9), ('liceo', 5, 8)]
+
+# sizes of the synthetic suite (see generate)
+SIZES = [
+    {'sessions': 20, 'rooms': 3, 'professors': 6, 'cds': 2, 'timeslots_per_day': 6, 'tightness': 0.3},
+    {'sessions': 40, 'rooms': 5, 'professors': 10, 'cds': 4, 'timeslots_per_day': 8, 'tightness': 0.4},
+    {'sessions': 80, 'rooms': 8, 'professors': 20, 'cds': 6, 'timeslots_per_day': 8, 'tightness': 0.4},
+    {'sessions': 80, 'rooms': 8, 'professors': 20, 'cds': 6, 'timeslots_per_day': 8, 'tightness': 0.6},
+    {'sessions': 160, 'rooms': 12, 'professors': 40, 'cds': 10, 'timeslots_per_day': 9, 'tightness': 0.5},
+]
+
+# Z3 statistics copied to the CSV report (the JSON report has all of them)
+STATISTICS = ['conflicts', 'decisions', 'propagations', 'max memory']
+
+def generate(fname: str, sessions = 40, rooms = 5, professors = 10, cds = 4, timeslots_per_day = 8, tightness = 0.4, seed = 0):
+    """Create a synthetic database ./databases/{fname}.db with the schema of fill_data/create_empy.sql.
+    Every course has about three sessions and belongs to one CdS (sometimes two); professors are spread over the
+    courses. The hours of the sessions are drawn so that they fill about a fraction tightness of the room-timeslots of
+    the week: low values give easy instances, values close to 1 give hard or unsatisfiable ones.
+    Input:
+        fname (str): database name
+        sessions, rooms, professors, cds (int): number of rows of the respective tables
+        timeslots_per_day (int): used to size the hours (sessions never last more than a day)
+        tightness (float): target occupancy of the rooms
+        seed (int): seed of the random generator, the same arguments always give the same database
+    Output: path of the database"""
+    rng = random.Random(seed)
+    path = f"./databases/{fname}.db"
+    if os.path.exists(path):
+        os.remove(path)
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fill_data', 'create_empy.sql')) as f:
+        schema = f.read()
+
+    con = sq3.connect(path)
+    con.executescript(schema)
+
+    courses = max(1, sessions // 3)
+    cds_students = {K: rng.randint(20, 150) for K in range(1, cds + 1)}
+    course_cds = {C: [(C - 1) % cds + 1] for C in range(1, courses + 1)}
+    for C in course_cds:
+        if cds > 1 and rng.random() < 0.2:
+            course_cds[C].append(rng.choice([K for K in cds_students if K not in course_cds[C]]))
+    largest = max(sum(cds_students[K] for K in ks) for ks in course_cds.values())
+
+    mean = tightness * rooms * 6 * timeslots_per_day / sessions
+    hours = [min(max(1, round(rng.gauss(mean, 0.5))), timeslots_per_day, 4) for _ in range(sessions)]
+
+    con.execute("BEGIN")
+    con.executemany("INSERT INTO Professor VALUES (?, ?)", [(P, f"Professor {P}") for P in range(1, professors + 1)])
+    con.executemany("INSERT INTO Courses VALUES (?, ?, ?)", [(C, (C - 1) % professors + 1, f"Course {C}") for C in course_cds])
+    con.executemany("INSERT INTO Session VALUES (?, ?, ?)", [(S, hours[S - 1], (S - 1) % courses + 1) for S in range(1, sessions + 1)])
+    con.executemany("INSERT INTO CdS VALUES (?, ?, ?)", [(K, f"CdS {K}", n) for (K, n) in cds_students.items()])
+    con.executemany("INSERT INTO CourseCdS VALUES (?, ?)", [(C, K) for (C, ks) in course_cds.items() for K in ks])
+    # the first room fits every course
+    con.executemany("INSERT INTO Rooms VALUES (?, ?, ?)", [(R, largest if R == 1 else rng.randint(20, largest), f"Room {R}") for R in range(1, rooms + 1)])
+    con.commit()
+    con.close()
+
+    return path
+
+def run(fname: str, timeslots_per_day: int, t_start: int, timeout = None, **flags):
+    """Build and solve one instance, timing each phase.
+    Input:
+        fname (str): database name
+        timeslots_per_day (int), t_start (int): as in TimetableScheduler
+        timeout (int): solver timeout in milliseconds, None for no timeout
+        flags: any other keyword argument of TimetableScheduler (engine, encoding, ...)
+    Output: dictionary with the timings (in seconds), the size of the model, the peak resident memory of the process
+    (in MB), the statistics of Z3 and the solver's answer"""
+
+    scheduler = TimetableScheduler(fname, timeslots_per_day, t_start, optional_constraints=True, **flags)
+    scheduler.set_budget(timeout)
+
+    t0 = time.perf_counter()
+    scheduler.start()
+    t1 = time.perf_counter()
+    scheduler.add_constraints()
+    t2 = time.perf_counter()
+    # an instance violating the pre-checks is not built (see TimetableScheduler.add_constraints)
+    answer = 'unsat' if scheduler.violations else scheduler.solver.check(*scheduler.assumptions())
+    t3 = time.perf_counter()
+
+    if scheduler.engine == 'integer':
+        variables = len(scheduler.Start) + len(scheduler.Day) + len(scheduler.Room)
+    else:
+        variables = len(scheduler.X) + len(scheduler.Y)
+
+    result = {
+        'database': fname,
+        'flags': flags,
+        'start': t1 - t0,
+        'build': t2 - t1,
+        'solve': t3 - t2,
+        'variables': variables,
+        'assertions': len(scheduler.solver.assertions()),
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'statistics': scheduler.statistics(),
+        'answer': str(answer),
+    }
+    scheduler.end()
+    return result
+
+def run_task(task):
+    """Unpack a (fname, timeslots_per_day, t_start, timeout, flags) task for run() (used by the process pool)."""
+    (fname, timeslots_per_day, t_start, timeout, flags) = task
+    return run(fname, timeslots_per_day, t_start, timeout, **flags)
+
+def compare_engines(timeout = 60000, databases = DATABASES):
+    """Run the boolean engine (both encodings) and the integer engine on every database and print a summary table.
+    Input:
+        timeout (int): solver timeout in milliseconds for each run
+        databases (List[Tuple[str, int, int]]): (database, timeslots_per_day, t_start) triples
+    Output: list of the results returned by run()"""
+
+    configurations = [
+        {'engine': 'boolean', 'encoding': 'pairwise'},
+        {'engine': 'boolean', 'encoding': 'cardinality'},
+        {'engine': 'integer'},
+    ]
+
+    results = []
+    print(f"{'database':<10} {'engine':<22} {'vars':>7} {'asserts':>8} {'start':>8} {'build':>8} {'solve':>8}  answer")
+    for (fname, timeslots_per_day, t_start) in databases:
+        for flags in configurations:
+            r = run(fname, timeslots_per_day, t_start, timeout, **flags)
+            results.append(r)
+            label = '/'.join(flags.values())
+            print(f"{fname:<10} {label:<22} {r['variables']:>7} {r['assertions']:>8} {r['start']:>8.2f} {r['build']:>8.2f} {r['solve']:>8.2f}  {r['answer']}")
+
+    return results
+
+def compare_backends(command = None, timeout = 60000, databases = [('liceo', 5, 8), ('aida', 9, 9)]):
+    """Solve every database through the SMT solver (.solve()) and as a pure SAT problem (.solve_sat()) with Z3's SAT
+    solver and, if given, an external one, and print the time of each phase.
+    Input:
+        command (List[str]): external SAT solver, as in TimetableScheduler.solve_sat (None to skip it)
+        timeout (int): solver timeout in milliseconds for each run
+        databases (List[Tuple[str, int, int]]): (database, timeslots_per_day, t_start) triples
+    Output: list of dictionaries with the database, the backend, the answer and the phases of the scheduler's metrics"""
+    backends = [('smt', None), ('sat/z3', None)] + ([(f"sat/{os.path.basename(command[0])}", command)] if command else [])
+
+    results = []
+    print(f"{'database':<10} {'backend':<16} {'build':>8} {'cnf':>8} {'check':>8} {'extract':>8} {'total':>8}  answer")
+    for (fname, timeslots_per_day, t_start) in databases:
+        for (label, backend) in backends:
+            scheduler = TimetableScheduler(fname, timeslots_per_day, t_start, optional_constraints=True, encoding='cardinality', callback=None)
+            scheduler.start()
+            scheduler.add_constraints()
+            if label == 'smt':
+                r = scheduler.solve(timeout)
+            else:
+                r = scheduler.solve_sat(backend, timeout=timeout)
+            phases = dict(scheduler.metrics.phases)
+            scheduler.end()
+
+            results.append({'database': fname, 'backend': label, 'answer': r.status, 'phases': phases})
+            total = sum(phases.get(p, 0) for p in ['constraints', 'cnf', 'check', 'extract'])
+            print(f"{fname:<10} {label:<16} {phases.get('constraints', 0):>8.2f} {phases.get('cnf', 0):>8.2f} {phases.get('check', 0):>8.2f} {phases.get('extract', 0):>8.2f} {total:>8.2f}  {r.status}")
+
+    return results
+
+def available_copy(fname: str):
+    """Copy a database to ./databases/{fname}_available.db without its availability rows, so that every professor, room
+    and CdS is always available (the caller removes the copy).
+    Input: fname (str): database name
+    Output: name of the copy"""
+    copy = f"{fname}_available"
+    (source, target) = (sq3.connect(f"./databases/{fname}.db"), sq3.connect(f"./databases/{copy}.db"))
+    source.backup(target)
+    for table in ['ProfessorUnavailability', 'RoomUnavailability', 'CdSUnavailability']:
+        target.execute(f"DELETE FROM {table};")
+    target.commit()
+    source.close()
+    target.close()
+    return copy
+
+def compare_availability(timeout = 60000, databases = DATABASES, encoding = 'cardinality'):
+    """Measure the reduction of the model given by the availability calendars: every database is solved as it is and
+    through a copy without availability rows (see available_copy, removed afterwards).
+    Input:
+        timeout (int): solver timeout in milliseconds for each run
+        databases (List[Tuple[str, int, int]]): (database, timeslots_per_day, t_start) triples
+        encoding (str): encoding of the boolean engine, as in TimetableScheduler
+    Output: list of the results returned by run(), the copies under the database name {fname}_available"""
+    results = []
+    print(f"{'database':<22} {'vars':>7} {'asserts':>8} {'start':>8} {'build':>8} {'solve':>8}  answer")
+    for (fname, timeslots_per_day, t_start) in databases:
+        copy = available_copy(fname)
+        try:
+            for name in [copy, fname]:
+                r = run(name, timeslots_per_day, t_start, timeout, encoding=encoding)
+                results.append(r)
+                print(f"{name:<22} {r['variables']:>7} {r['assertions']:>8} {r['start']:>8.2f} {r['build']:>8.2f} {r['solve']:>8.2f}  {r['answer']}")
+        finally:
+            os.remove(f"./databases/{copy}.db")
+
+    return results
+
+def measure_build(task):
+    """Build (without solving) one instance, timing start and add_constraints or, if trace is True, tracing the Python
+    heap with tracemalloc (which slows every allocation down, so the two are measured by separate builds). Meant to
+    run in a fresh process (see compare_builds), so that the heap holds nothing but the scheduler.
+    Input: task (Tuple): (fname, timeslots_per_day, t_start, flags, trace), the first four as in run()
+    Output: dictionary with the timings of start and add_constraints (in seconds) or the heap after start, its peak
+    during add_constraints and the heap after it (in MB)"""
+    (fname, timeslots_per_day, t_start, flags, trace) = task
+    scheduler = TimetableScheduler(fname, timeslots_per_day, t_start, optional_constraints=True, callback=None, **flags)
+    if trace:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    scheduler.start()
+    t1 = time.perf_counter()
+    if trace:
+        (started, _) = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    scheduler.add_constraints()
+    t2 = time.perf_counter()
+    if trace:
+        (built, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result = {'heap start': started / 2**20, 'heap peak': peak / 2**20, 'heap built': built / 2**20}
+    else:
+        result = {'start': t1 - t0, 'build': t2 - t1}
+    scheduler.end()
+    return result
+
+def compare_builds(databases = DATABASES, encodings = ['pairwise', 'cardinality']):
+    """Measure the cost in time and Python heap of building the model of every database with every encoding, each build
+    in its own process (see measure_build). The builds run on copies without availability rows (see available_copy),
+    so that the size of the model does not depend on the calendars; run `python benchmark.py build` on two commits to
+    compare them.
+    Input:
+        databases (List[Tuple[str, int, int]]): (database, timeslots_per_day, t_start) triples
+        encodings (List[str]): encodings of the boolean engine, as in TimetableScheduler
+    Output: list of dictionaries with the database, the flags, the current git commit and the measures of
+    measure_build()"""
+    commit = revision()
+    copies = [available_copy(fname) for (fname, _, _) in databases]
+    builds = [(copy, timeslots_per_day, t_start, {'encoding': encoding})
+              for (copy, (_, timeslots_per_day, t_start)) in zip(copies, databases) for encoding in encodings]
+
+    results = []
+    print(f"commit {commit}")
+    print(f"{'database':<22} {'encoding':<12} {'start':>8} {'build':>8} {'heap':>8} {'peak':>8} {'built':>8}")
+    try:
+        with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+            for build in builds:
+                (timings, heap) = pool.map(measure_build, [build + (False,), build + (True,)])
+                r = {'database': build[0], 'flags': build[3], 'commit': commit, **timings, **heap}
+                results.append(r)
+                print(f"{r['database']:<22} {r['flags']['encoding']:<12} {r['start']:>8.2f} {r['build']:>8.2f} {r['heap start']:>8.1f} {r['heap peak']:>8.1f} {r['heap built']:>8.1f}")
+    finally:
+        for copy in copies:
+            os.remove(f"./databases/{copy}.db")
+
+    return results
+
+def revision():
+    """Return the git commit of the working tree, or None outside of a git repository."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def suite(sizes = SIZES, configurations = None, timeout = 60000, seed = 0, report = 'benchmark', t_start = 8):
+    """Generate a synthetic database for every size and run every configuration on it. Each run happens in its own
+    process, so that the peak memory is measured per run. The results are written to {report}.json (everything) and
+    {report}.csv (one row per run, with the statistics of STATISTICS), tagged with the current git commit.
+    Input:
+        sizes (List[Dict]): keyword arguments of generate()
+        configurations (List[Dict]): keyword arguments of TimetableScheduler, by default the cardinality encoding (the
+            pairwise one takes minutes to build the largest sizes)
+        timeout (int): solver timeout in milliseconds for each run
+        seed (int): seed of the generator
+        report (str): path of the reports, without extension (None to skip writing them)
+        t_start (int): as in TimetableScheduler
+    Output: list of the results returned by run(), with the size of the instance under 'size'"""
+    configurations = configurations or [{'encoding': 'cardinality'}]
+    commit = revision()
+
+    tasks = []
+    for (i, size) in enumerate(sizes):
+        fname = f"bench_{i}"
+        generate(fname, seed=seed, **size)
+        for flags in configurations:
+            tasks.append((size, (fname, size['timeslots_per_day'], t_start, timeout, flags)))
+
+    results = []
+    print(f"{'database':<10} {'sessions':>8} {'tight':>6} {'flags':<30} {'asserts':>8} {'start':>8} {'build':>8} {'solve':>8} {'rss':>8}  answer")
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for ((size, _), r) in zip(tasks, pool.imap(run_task, [t for (_, t) in tasks])):
+            r.update({'size': size, 'commit': commit})
+            results.append(r)
+            label = ','.join(f"{k}={v}" for (k, v) in r['flags'].items()) or 'default'
+            print(f"{r['database']:<10} {size['sessions']:>8} {size['tightness']:>6} {label:<30} {r['assertions']:>8} {r['start']:>8.2f} {r['build']:>8.2f} {r['solve']:>8.2f} {r['rss']:>8.1f}  {r['answer']}")
+
+    if report is not None:
+        with open(f"{report}.json", 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        with open(f"{report}.csv", 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['commit', 'database'] + list(sizes[0]) + ['flags', 'variables', 'assertions', 'start', 'build', 'solve', 'rss', 'answer'] + STATISTICS)
+            for r in results:
+                writer.writerow([r['commit'], r['database']] + [r['size'].get(k) for k in sizes[0]] +
+                                [json.dumps(r['flags']), r['variables'], r['assertions'], r['start'], r['build'], r['solve'], r['rss'], r['answer']] +
+                                [r['statistics'].get(k) for k in STATISTICS])
+
+    return results
+
+def compare_reports(old: str, new: str):
+    """Print the ratio new/old of the timings and memory of two JSON reports written by suite() (e.g. by two commits).
+    Runs are matched by database and flags.
+    Input: old (str), new (str): paths of the JSON reports
+    Output: list of (database, flags, {measure: ratio}) triples"""
+    with open(old) as f:
+        before = {(r['database'], json.dumps(r['flags'], sort_keys=True)): r for r in json.load(f)}
+    with open(new) as f:
+        after = json.load(f)
+
+    rows = []
+    print(f"{'database':<10} {'flags':<30} {'build':>8} {'solve':>8} {'rss':>8}  answers")
+    for r in after:
+        key = (r['database'], json.dumps(r['flags'], sort_keys=True))
+        if key not in before:
+            continue
+        b = before[key]
+        ratios = {m: r[m] / b[m] if b[m] else None for m in ['start', 'build', 'solve', 'rss']}
+        rows.append((key[0], r['flags'], ratios))
+        fmt = lambda x: f"{x:>8.2f}" if x is not None else f"{'-':>8}"
+        print(f"{key[0]:<10} {key[1]:<30} {fmt(ratios['build'])} {fmt(ratios['solve'])} {fmt(ratios['rss'])}  {b['answer']} -> {r['answer']}")
+
+    return rows
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['suite']:
+        suite()
+    elif sys.argv[1:2] == ['compare']:
+        compare_reports(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ['sat']:
+        compare_backends(sys.argv[2:] or None)
+    elif sys.argv[1:2] == ['availability']:
+        compare_availability()
+    elif sys.argv[1:2] == ['build']:
+        compare_builds()
+    else:
+        compare_engines()
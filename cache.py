@@ -0,0 +1,108 @@
+"""
+File containing the on-disk caches of TimetableScheduler. Both are keyed by a content hash of the instance and of the
+parameters, so that any change of the source tables invalidates them.
+- Compiled models: the assertions built by TimetableScheduler.add_constraints are stored as SMT-LIB2 in ./cache/ and
+  parsed back by Z3 on a hit, skipping the Python construction loops.
+- Results: the answer of TimetableScheduler.solve (and the schedule, if any) is stored as JSON in ./cache/results/, so
+  that solving an unchanged problem again does not call Z3. The least recently used results are evicted.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Optional
+import z3
+from instance import Instance
+
+CACHE_DIR = "./cache"
+RESULT_DIR = os.path.join(CACHE_DIR, "results")
+
+# maximum number of results kept on disk
+RESULT_CACHE_SIZE = 128
+
+# bump when the constraints posted by TimetableScheduler change, to invalidate the cached models
+MODEL_VERSION = 2
+
+def fingerprint(instance: Instance, parameters: Dict) -> str:
+    """Return a hash of the instance data and of the parameters of the model.
+    Input:
+        instance (Instance): the instance the model is built from
+        parameters (Dict): anything else the formula depends on (timeslots per day, encoding, engine, ...)
+    Output: hexadecimal SHA-256 digest"""
+    data = {
+        'version': MODEL_VERSION,
+        'z3': z3.get_version_string(),
+        'parameters': parameters,
+        'sessions': [(S, instance.hours[S], instance.session_course[S]) for S in instance.sessions],
+        'courses': [(C, instance.course_professor[C], list(instance.course_cds[C])) for C in instance.courses],
+        'professors': list(instance.professors),
+        'cds': [(K, instance.cds_students[K]) for K in instance.cds],
+        'rooms': [(R, instance.capacity[R]) for R in instance.rooms],
+        'unavailable': {k: sorted(rows) for (k, rows) in instance.unavailable().items()},
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+def path(key: str) -> str:
+    """Return the file of a cached model."""
+    return os.path.join(CACHE_DIR, f"{key}.smt2")
+
+def load_model(key: str) -> Optional[str]:
+    """Return the file of a cached model, or None on a miss."""
+    return path(key) if os.path.exists(path(key)) else None
+
+def store_model(key: str, assertions):
+    """Write assertions as SMT-LIB2 under the given key. The file is written under a temporary name and then renamed, so
+    that concurrent schedulers never read a partial model."""
+    solver = z3.Solver()
+    solver.add(assertions)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    (fd, tmp) = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(solver.sexpr())
+    os.replace(tmp, path(key))
+
+def clear_models():
+    """Remove all the cached models."""
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith('.smt2'):
+                os.remove(os.path.join(CACHE_DIR, name))
+
+def load_result(key: str) -> Optional[Dict]:
+    """Return a cached result, or None on a miss. A hit marks the result as the most recently used one."""
+    file = os.path.join(RESULT_DIR, f"{key}.json")
+    try:
+        with open(file) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    os.utime(file)
+    return result
+
+def store_result(key: str, result: Dict, size = RESULT_CACHE_SIZE):
+    """Write a result under the given key and evict the least recently used results beyond size.
+    Input:
+        key (str): fingerprint of the problem
+        result (Dict): JSON-serializable result (status, rows, objectives)
+        size (int): maximum number of results kept"""
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    (fd, tmp) = tempfile.mkstemp(dir=RESULT_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp, os.path.join(RESULT_DIR, f"{key}.json"))
+
+    files = [os.path.join(RESULT_DIR, name) for name in os.listdir(RESULT_DIR) if name.endswith('.json')]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for file in files[size:]:
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+def clear_results():
+    """Remove all the cached results."""
+    if os.path.isdir(RESULT_DIR):
+        for name in os.listdir(RESULT_DIR):
+            if name.endswith('.json'):
+                os.remove(os.path.join(RESULT_DIR, name))
@@ -0,0 +1,104 @@
+"""
+File containing the pre-solve analysis used by TimetableScheduler.solve_decomposed. Sessions only interact through
+shared rooms (C1), professors (C3) and CdS (C4): the conflict graph is split into components that can be solved as
+separate Z3 problems and merged afterwards.
+"""
+
+from typing import Dict, List, Tuple
+from instance import Instance
+
+def union_find(items, edges) -> List[List]:
+    """Return the connected components of the graph (items, edges), each as a list of items in their original order."""
+    parent = {i: i for i in items}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (a, b) in edges:
+        (ra, rb) = (find(a), find(b))
+        if ra != rb:
+            parent[rb] = ra
+
+    groups = {}
+    for i in items:
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+def staff_components(instance: Instance) -> List[List[int]]:
+    """Components of the sessions linked by a common professor or CdS (C3, C4). Sessions of different components only
+    compete for rooms."""
+    edges = []
+    for S in instance.sessions:
+        edges.extend((S, Si) for Si in instance.professor_sessions[instance.professor[S]])
+        edges.extend((S, Si) for Si in instance.conflicts[S])
+    return union_find(instance.sessions, edges)
+
+def split_rooms(components: List[List[int]], rooms: List[int], instance: Instance, domains: Dict, slots: int):
+    """Give every component its own subset of rooms, so that the components become independent.
+    First every component gets the smallest free room fitting its largest session, then the remaining rooms go, largest
+    first, to the component with the highest demand (hours to place per room already assigned).
+    Input:
+        components (List[List[int]]): sessions of each component
+        rooms (List[int]): rooms to split
+        instance (Instance), domains (Dict): the instance and the feasible (starts, rooms) of every session
+        slots (int): number of timeslots in the week
+    Output: list of room lists, one per component, or None if some component cannot get a room for all its sessions"""
+    free = sorted(rooms, key=lambda R: instance.capacity[R])
+    assigned = [[] for _ in components]
+    demand = [sum(instance.hours[S] for S in c) for c in components]
+
+    order = sorted(range(len(components)), key=lambda i: -max(instance.session_students(S) for S in components[i]))
+    for i in order:
+        need = max(instance.session_students(S) for S in components[i])
+        fitting = [R for R in free if instance.capacity[R] >= need]
+        if not fitting:
+            return None
+        assigned[i].append(fitting[0])
+        free.remove(fitting[0])
+
+    for R in reversed(free):
+        i = max(range(len(components)), key=lambda i: demand[i] / (slots * len(assigned[i])))
+        assigned[i].append(R)
+
+    for (c, rooms) in zip(components, assigned):
+        if any(not set(domains[S][1]) & set(rooms) for S in c):
+            return None
+    return assigned
+
+def decompose(instance: Instance, domains: Dict, slots: int) -> List[Tuple[List[int], List[int], List[Tuple[List[int], List[int]]]]]:
+    """Split the instance into groups that can be solved independently, and the groups into parts if possible.
+    Components of the staff graph whose feasible rooms do not overlap are fully independent groups. The components of a
+    group are only coupled through rooms (weakly coupled) and are separated by splitting the rooms among them (see
+    split_rooms); such a split may make a part unsatisfiable, in which case the caller should solve the group as a whole.
+    Input:
+        instance (Instance), domains (Dict): the instance and the feasible (starts, rooms) of every session
+        slots (int): number of timeslots in the week
+    Output: list of (sessions, rooms, parts) triples, one per group, where parts is a list of (sessions, rooms) pairs"""
+    staff = staff_components(instance)
+
+    # components sharing a feasible room are coupled
+    rooms_of = [sorted({R for S in c for R in domains[S][1]}) for c in staff]
+    edges = []
+    owner = {}
+    for (i, rooms) in enumerate(rooms_of):
+        for R in rooms:
+            if R in owner:
+                edges.append((owner[R], i))
+            owner[R] = i
+    coupled = union_find(list(range(len(staff))), edges)
+
+    groups = []
+    for group in coupled:
+        components = [staff[i] for i in group]
+        sessions = [S for c in components for S in c]
+        rooms = [R for R in instance.rooms if any(R in rooms_of[i] for i in group)]
+        split = split_rooms(components, rooms, instance, domains, slots) if len(components) > 1 else None
+        if split is None:
+            groups.append((sessions, rooms, [(sessions, rooms)]))
+        else:
+            groups.append((sessions, rooms, list(zip(components, split))))
+
+    return groups
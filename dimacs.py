@@ -0,0 +1,92 @@
+"""
+File containing the pure SAT backend of TimetableScheduler (see TimetableScheduler.solve_sat). The Boolean model is
+compiled to CNF by Z3's tactics (the cardinality constraints become sorting networks and totalizers), written in DIMACS
+and solved either by Z3's SAT solver or by an external solver reading DIMACS and answering in the format of the SAT
+competitions (kissat, cadical, minisat, ...). The assignment is mapped back to the variables of the model through the
+names that Z3 writes in the comments of the DIMACS file.
+"""
+
+import re
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from z3 import *
+
+# Z3 tactics compiling a Boolean formula with cardinality constraints to CNF
+CNF_TACTICS = ['simplify', 'propagate-values', 'pb2bv', 'simplify', 'bit-blast', 'tseitin-cnf']
+
+def compile_cnf(formulas) -> Goal:
+    """Compile formulas to CNF.
+    Input: formulas (List[BoolRef]): assertions and assumed literals of the model
+    Output: Goal of clauses; its convert_model() maps a model of the clauses back to the variables of the formulas"""
+    goal = Goal()
+    goal.add(formulas)
+    return Then(*CNF_TACTICS)(goal)[0]
+
+def write_dimacs(goal: Goal, path: str) -> Dict[int, str]:
+    """Write the clauses of a goal in DIMACS.
+    Input: goal (Goal): as returned by compile_cnf; path (str): destination file
+    Output: DIMACS variable -> name of the Z3 variable, for the named variables"""
+    text = goal.dimacs()
+    with open(path, 'w') as f:
+        f.write(text)
+    return names(text)
+
+def names(text: str) -> Dict[int, str]:
+    """Return the names written by Z3 in the comments of a DIMACS text (lines 'c <variable> <name>')."""
+    return {int(m.group(1)): m.group(2) for m in re.finditer(r'^c (\d+) (\S+)$', text, re.M)}
+
+def parse_output(text: str) -> Tuple[str, Dict[int, bool]]:
+    """Read the output of a SAT solver in the format of the SAT competitions ('s SATISFIABLE', 'v 1 -2 ... 0').
+    Output: (answer, DIMACS variable -> value), the answer being 'sat', 'unsat' or 'unknown'"""
+    answer = 'unknown'
+    assignment = {}
+    for line in text.splitlines():
+        if line.startswith('s '):
+            answer = {'SATISFIABLE': 'sat', 'UNSATISFIABLE': 'unsat'}.get(line[2:].strip(), 'unknown')
+        elif line.startswith('v '):
+            for literal in map(int, line[2:].split()):
+                if literal != 0:
+                    assignment[abs(literal)] = literal > 0
+    return (answer, assignment)
+
+def run_solver(command: List[str], path: str, timeout: Optional[int] = None) -> Tuple[str, Dict[int, bool]]:
+    """Run an external SAT solver on a DIMACS file.
+    Input:
+        command (List[str]): the solver and its options, the path of the file is appended
+        path (str): DIMACS file
+        timeout (int): wall-clock timeout in milliseconds, None for no timeout
+    Output: (answer, DIMACS variable -> value), as in parse_output"""
+    try:
+        process = subprocess.run(command + [path], capture_output=True, text=True,
+                                 timeout=timeout / 1000 if timeout is not None else None)
+    except subprocess.TimeoutExpired:
+        return ('unknown', {})
+    return parse_output(process.stdout)
+
+def solve_cnf(path: str, timeout: Optional[int] = None) -> Tuple[str, Dict[int, bool], Dict, Optional[str]]:
+    """Solve a DIMACS file with Z3's SAT solver. The file is parsed by Z3 itself, which is much faster than adding the
+    clauses through the Python API; the DIMACS variable N is the Z3 variable k!N.
+    Input: path (str): DIMACS file; timeout (int): milliseconds, None for no timeout
+    Output: (answer, DIMACS variable -> value, statistics of the solver, reason of an unknown answer)"""
+    solver = SolverFor('QF_FD')
+    if timeout is not None:
+        solver.set("timeout", timeout)
+    solver.from_file(path)
+    answer = solver.check()
+    st = solver.statistics()
+    statistics = {k: st.get_key_value(k) for k in st.keys()}
+    assignment = {}
+    if answer == sat:
+        model = solver.model()
+        assignment = {int(d.name()[2:]): is_true(model[d]) for d in model.decls()}
+    return (str(answer), assignment, statistics, solver.reason_unknown() if answer == unknown else None)
+
+def to_model(goal: Goal, values: Dict[str, bool]) -> ModelRef:
+    """Turn the values of the named DIMACS variables into a model of the variables of the original formulas. The literals
+    are parsed as SMT-LIB2, much faster than building them one by one through the Python API.
+    Input: goal (Goal): as returned by compile_cnf; values (Dict[str, bool]): name -> value
+    Output: ModelRef"""
+    solver = Solver()
+    solver.from_string("".join(f"(declare-const |{n}| Bool)(assert {f'|{n}|' if v else f'(not |{n}|)'})" for (n, v) in values.items()))
+    solver.check()
+    return goal.convert_model(solver.model())
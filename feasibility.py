@@ -0,0 +1,75 @@
+"""
+File containing the pre-solve feasibility analysis used by TimetableScheduler.precheck. It runs counting and matching
+bounds on the instance, in milliseconds, to catch the infeasible instances before the model is built: every violated
+bound is a proof that no timetable exists.
+"""
+
+from typing import Dict, List, Tuple
+from instance import Instance
+
+def analyze(instance: Instance, timeslots_per_day: int, domains: Dict, optional_constraints = False, days = 6,
+            unavailable: Dict = None) -> List[Tuple[str, Dict, str]]:
+    """Check the necessary conditions of the constraints:
+    - C2: every session fits in a day; C5: every session has a room large enough (from the pruned domains);
+    - C3, C4: the sessions of a professor or of a CdS fit in the hours of the week it is available in, and the sessions
+      longer than half a day fit in the week (no two of them fit in the same day);
+    - C1: the sessions fit in the available hours of the rooms, for every capacity threshold d: the sessions with at least d students cannot take
+      more hours than the rooms seating at least d students offer (Hall's condition of the session-room assignment);
+    - OPTIONAL: a course has at most one session per day.
+    Input:
+        instance (Instance): the instance
+        timeslots_per_day (int): timeslots of a day
+        domains (Dict): session -> (feasible start slots, feasible rooms), see TimetableScheduler.prune
+        optional_constraints (bool): also check the optional constraints
+        days (int): days of the week
+        unavailable (Dict): timeslots in which the professors, rooms and CdS are unavailable, see
+            TimetableScheduler.unavailable_timeslots; None if they are always available
+    Output: list of (family, indexes, detail) triples, one per violated bound, the indexes as in the tracking labels of
+    TimetableScheduler.post (S: session, R: room, P: professor, K: CdS, C: course); empty if no bound is violated"""
+    r = timeslots_per_day
+    week = days * r
+    violations = []
+    unavailable = unavailable or {'P': {}, 'R': {}, 'K': {}}
+    # available timeslots of every room
+    open_slots = {R: week - len(unavailable['R'].get(R, ())) for R in instance.rooms}
+
+    for S in instance.sessions:
+        (starts, rooms) = domains[S]
+        if instance.hours[S] > r:
+            violations.append(('C2', {'S': S}, f"{instance.hours[S]} hours, the day has {r} timeslots"))
+        elif not starts:
+            violations.append(('C2', {'S': S}, "no feasible start"))
+        if not rooms:
+            violations.append(('C5', {'S': S}, f"{instance.session_students(S)} students, no room large enough"))
+
+    groups = [('C3', 'P', P, instance.professor_sessions.get(P, ())) for P in instance.professors] + \
+             [('C4', 'K', K, instance.cds_sessions.get(K, ())) for K in instance.cds]
+    for (family, k, v, sessions) in groups:
+        hours = sum(instance.hours[S] for S in sessions)
+        available = week - len(unavailable[k].get(v, ()))
+        if hours > available:
+            violations.append((family, {k: v}, f"{hours} hours of lectures, available in {available} timeslots of the week"))
+        long = [S for S in sessions if 2*instance.hours[S] > r]
+        if len(long) > days:
+            violations.append((family, {k: v}, f"{len(long)} sessions longer than half a day, the week has {days} days"))
+
+    hours = sum(instance.hours[S] for S in instance.sessions)
+    if hours > sum(open_slots.values()):
+        violations.append(('C1', {}, f"{hours} hours of lectures, the rooms offer {sum(open_slots.values())} room-timeslots"))
+    else:
+        # Hall's condition on nested demands: sessions needing d seats can only use the rooms seating at least d
+        for d in sorted({instance.session_students(S) for S in instance.sessions}):
+            demand = sum(instance.hours[S] for S in instance.sessions if instance.session_students(S) >= d)
+            rooms = [R for R in instance.rooms if instance.capacity[R] >= d]
+            offer = sum(open_slots[R] for R in rooms)
+            if rooms and demand > offer:
+                violations.append(('C1', {}, f"{demand} hours of lectures with at least {d} students, the {len(rooms)} rooms "
+                                             f"seating them offer {offer} room-timeslots"))
+                break
+
+    if optional_constraints:
+        for C in instance.courses:
+            if len(instance.course_sessions.get(C, ())) > days:
+                violations.append(('OPTIONAL', {'C': C}, f"{len(instance.course_sessions[C])} sessions, at most one per day"))
+
+    return violations
@@ -120,3 +120,70 @@ INSERT INTO Rooms (IDRoom, Capacity, Name) VALUES
     (10, 151, 'H3, 2A'),
     (11, 136, 'H3, 2B'),
     (12, 74, 'H3, 2C');
+
+/* ----------  Availability (Day 0 = Monday, Hour = clock hour the blocked hour starts at)  ---------- */
+/* D.D.S. does not teach on Fridays, G.C. not on Monday and Tuesday mornings */
+INSERT INTO ProfessorUnavailability (IDProfessor, Day, Hour) VALUES
+    (1, 4, 9),
+    (1, 4, 10),
+    (1, 4, 11),
+    (1, 4, 12),
+    (1, 4, 13),
+    (1, 4, 14),
+    (1, 4, 15),
+    (1, 4, 16),
+    (1, 4, 17),
+
+    (3, 0, 9),
+    (3, 0, 10),
+    (3, 0, 11),
+    (3, 0, 12),
+
+    (3, 1, 9),
+    (3, 1, 10),
+    (3, 1, 11),
+    (3, 1, 12);
+
+/* H2 Bis, 2A MORIN is booked on Wednesday morning, H3, 1A on Thursday afternoon */
+INSERT INTO RoomUnavailability (IDRoom, Day, Hour) VALUES
+    (1, 2, 9),
+    (1, 2, 10),
+    (1, 2, 11),
+    (1, 2, 12),
+
+    (7, 3, 14),
+    (7, 3, 15),
+    (7, 3, 16),
+    (7, 3, 17);
+
+/* no lectures on Saturday */
+INSERT INTO CdSUnavailability (IDCdS, Day, Hour) VALUES
+    (1, 5, 9),
+    (1, 5, 10),
+    (1, 5, 11),
+    (1, 5, 12),
+    (1, 5, 13),
+    (1, 5, 14),
+    (1, 5, 15),
+    (1, 5, 16),
+    (1, 5, 17),
+
+    (2, 5, 9),
+    (2, 5, 10),
+    (2, 5, 11),
+    (2, 5, 12),
+    (2, 5, 13),
+    (2, 5, 14),
+    (2, 5, 15),
+    (2, 5, 16),
+    (2, 5, 17),
+
+    (3, 5, 9),
+    (3, 5, 10),
+    (3, 5, 11),
+    (3, 5, 12),
+    (3, 5, 13),
+    (3, 5, 14),
+    (3, 5, 15),
+    (3, 5, 16),
+    (3, 5, 17);
@@ -35,6 +35,34 @@ CREATE TABLE Rooms (
     Name     TEXT
 );
 
+/* Availability calendars: the hours (Day 0-5 from Monday, Hour the clock hour it starts at) without lectures */
+CREATE TABLE ProfessorUnavailability (
+    IDProfessor INTEGER REFERENCES Professor(IDProfessor),
+    Day         INTEGER,
+    Hour        INTEGER,
+    PRIMARY KEY (IDProfessor, Day, Hour)
+);
+
+CREATE TABLE RoomUnavailability (
+    IDRoom INTEGER REFERENCES Rooms(IDRoom),
+    Day    INTEGER,
+    Hour   INTEGER,
+    PRIMARY KEY (IDRoom, Day, Hour)
+);
+
+CREATE TABLE CdSUnavailability (
+    IDCdS INTEGER REFERENCES CdS(IDCdS),
+    Day   INTEGER,
+    Hour  INTEGER,
+    PRIMARY KEY (IDCdS, Day, Hour)
+);
+
+/* Optional: weights of the soft constraints used by the optimization mode (see TimetableScheduler) */
+CREATE TABLE Preferences (
+    Name   TEXT PRIMARY KEY,
+    Weight INTEGER
+);
+
 CREATE TABLE SCHEDULE(
     Timeslot INTEGER,
     Session INTEGER,
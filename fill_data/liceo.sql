@@ -180,4 +180,27 @@ INSERT INTO Rooms (IDRoom, Capacity, Name) VALUES
   (1, 30, "ANNO III"),
   (2, 30, "ANNO IV"),
   (3, 30, "ANNO V"),
-  (4, 30, "PALESTRA");
\ No newline at end of file
+  (4, 30, "PALESTRA");
+
+/* ----------  Availability (Day 0 = Monday, Hour = clock hour the blocked hour starts at)  ---------- */
+/* boh 3 does not teach on Saturday, C.N. and L.G. not in the first two hours of Monday */
+INSERT INTO ProfessorUnavailability (IDProfessor, Day, Hour) VALUES
+    (10, 5, 8),
+    (10, 5, 9),
+    (10, 5, 10),
+    (10, 5, 11),
+    (10, 5, 12),
+
+    (7, 0, 8),
+    (7, 0, 9),
+
+    (8, 0, 8),
+    (8, 0, 9);
+
+/* the PALESTRA is used by another school on Wednesdays */
+INSERT INTO RoomUnavailability (IDRoom, Day, Hour) VALUES
+    (4, 2, 8),
+    (4, 2, 9),
+    (4, 2, 10),
+    (4, 2, 11),
+    (4, 2, 12);
@@ -50,4 +50,26 @@ INSERT INTO Rooms (IDRoom, Capacity, Name) VALUES
     (1, 200, "Big Room"),
     (2, 100, "Medium Room"),
     (3, 50, "Small Room"),
-    (4, 10, "Very Small Room");
\ No newline at end of file
+    (4, 10, "Very Small Room");
+
+/* ----------  Availability (Day 0 = Monday, Hour = clock hour the blocked hour starts at)  ---------- */
+/* John Doe does not teach on Mondays */
+INSERT INTO ProfessorUnavailability (IDProfessor, Day, Hour) VALUES
+    (3, 0, 3),
+    (3, 0, 4),
+    (3, 0, 5),
+    (3, 0, 6),
+    (3, 0, 7);
+
+/* the Big Room is booked on Tuesday morning */
+INSERT INTO RoomUnavailability (IDRoom, Day, Hour) VALUES
+    (1, 1, 3),
+    (1, 1, 4);
+
+/* CdS 2 has no lectures on Saturday */
+INSERT INTO CdSUnavailability (IDCdS, Day, Hour) VALUES
+    (2, 5, 3),
+    (2, 5, 4),
+    (2, 5, 5),
+    (2, 5, 6),
+    (2, 5, 7);
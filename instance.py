@@ -0,0 +1,146 @@
+"""
+File containing the in-memory snapshot of a timetabling instance. The snapshot is read once from the database
+(see SQLUtility.load_instance) and then used by the model builder instead of issuing one query per constraint.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
+
+@dataclass(frozen=True)
+class Instance:
+    """Immutable, indexed view of the tables Professor, Courses, Session, CdS, CourseCdS and Rooms, and of the availability
+    calendars ProfessorUnavailability, RoomUnavailability and CdSUnavailability."""
+
+    sessions: Tuple[int, ...]
+    courses: Tuple[int, ...]
+    professors: Tuple[int, ...]
+    cds: Tuple[int, ...]
+    rooms: Tuple[int, ...]
+
+    hours: Mapping[int, int]                        # session -> hours (H)
+    session_course: Mapping[int, int]               # session -> course (G)
+    course_professor: Mapping[int, int]             # course -> professor (P)
+    course_cds: Mapping[int, Tuple[int, ...]]       # course -> CdS it belongs to
+    students: Mapping[int, int]                     # course -> number of students (N)
+    cds_students: Mapping[int, int]                 # CdS -> number of students
+    capacity: Mapping[int, int]                     # room -> capacity (K)
+
+    professor: Mapping[int, int]                    # session -> professor (P o G)
+    conflicts: Mapping[int, frozenset]              # session -> sessions sharing a CdS, itself excluded (Delta)
+    course_sessions: Mapping[int, Tuple[int, ...]]  # course -> sessions
+    professor_sessions: Mapping[int, Tuple[int, ...]]  # professor -> sessions
+    cds_sessions: Mapping[int, Tuple[int, ...]]     # CdS -> sessions
+
+    # availability calendars: blocked hours as (day, hour) pairs, day 0 being Monday and hour the clock hour it starts at
+    professor_unavailable: Mapping[int, Tuple[Tuple[int, int], ...]]  # professor -> blocked hours
+    room_unavailable: Mapping[int, Tuple[Tuple[int, int], ...]]       # room -> blocked hours
+    cds_unavailable: Mapping[int, Tuple[Tuple[int, int], ...]]        # CdS -> blocked hours
+
+    @classmethod
+    def build(cls, sessions: Dict, courses: Dict, professors, cds: Dict, course_cds_pairs, rooms: Dict, unavailable: Dict = None) -> "Instance":
+        """Build the snapshot (and its derived indexes) from raw table contents.
+        Input:
+            sessions (Dict[int, Tuple[int, int]]): session ID -> (hours, course ID)
+            courses (Dict[int, int]): course ID -> professor ID
+            professors (Iterable[int]): professor IDs
+            cds (Dict[int, int]): CdS ID -> number of students
+            course_cds_pairs (Iterable[Tuple[int, int]]): rows of CourseCdS as (course ID, CdS ID)
+            rooms (Dict[int, int]): room ID -> capacity
+            unavailable (Dict): 'P', 'R' and 'K' -> rows of ProfessorUnavailability, RoomUnavailability and
+                CdSUnavailability as (ID, day, hour); None if every professor, room and CdS is always available
+        Output: Instance"""
+
+        course_cds_pairs = list(course_cds_pairs)
+        course_cds = {C: [] for C in courses}
+        for (C, K) in course_cds_pairs:
+            course_cds.setdefault(C, []).append(K)
+
+        course_sessions = {C: [] for C in courses}
+        professor_sessions = {P: [] for P in professors}
+        cds_sessions = {K: [] for K in cds}
+        professor = {}
+        for (S, (_, C)) in sessions.items():
+            course_sessions.setdefault(C, []).append(S)
+            professor[S] = courses.get(C)
+            professor_sessions.setdefault(professor[S], []).append(S)
+            for K in course_cds.get(C, []):
+                cds_sessions.setdefault(K, []).append(S)
+
+        conflicts = {}
+        for (S, (_, C)) in sessions.items():
+            others = set()
+            for K in course_cds.get(C, []):
+                others.update(cds_sessions[K])
+            others.discard(S)
+            conflicts[S] = frozenset(others)
+
+        students = {C: sum(cds[K] or 0 for K in course_cds[C]) for C in course_cds}
+
+        freeze = lambda d: MappingProxyType({k: tuple(v) for (k, v) in d.items()})
+
+        calendars = {'P': {}, 'R': {}, 'K': {}}
+        for (k, rows) in (unavailable or {}).items():
+            for (i, day, hour) in rows:
+                calendars[k].setdefault(i, []).append((day, hour))
+
+        return cls(
+            sessions=tuple(sessions),
+            courses=tuple(courses),
+            professors=tuple(professors),
+            cds=tuple(cds),
+            rooms=tuple(rooms),
+            hours=MappingProxyType({S: h for (S, (h, _)) in sessions.items()}),
+            session_course=MappingProxyType({S: C for (S, (_, C)) in sessions.items()}),
+            course_professor=MappingProxyType(dict(courses)),
+            course_cds=freeze(course_cds),
+            students=MappingProxyType(students),
+            cds_students=MappingProxyType(dict(cds)),
+            capacity=MappingProxyType(dict(rooms)),
+            professor=MappingProxyType(professor),
+            conflicts=MappingProxyType(conflicts),
+            course_sessions=freeze(course_sessions),
+            professor_sessions=freeze(professor_sessions),
+            cds_sessions=freeze(cds_sessions),
+            professor_unavailable=freeze(calendars['P']),
+            room_unavailable=freeze(calendars['R']),
+            cds_unavailable=freeze(calendars['K']),
+        )
+
+    def with_session(self, session, hours, course) -> "Instance":
+        """Return a copy of the instance with one more session of an existing course."""
+        sessions = {S: (self.hours[S], self.session_course[S]) for S in self.sessions}
+        sessions[session] = (hours, course)
+        pairs = [(C, K) for C in self.courses for K in self.course_cds[C]]
+        return Instance.build(sessions, dict(self.course_professor), self.professors, dict(self.cds_students), pairs, dict(self.capacity),
+                              self.unavailable())
+
+    def restrict(self, sessions, rooms) -> "Instance":
+        """Return a copy of the instance with only the given sessions and rooms (courses, professors and CdS are kept)."""
+        sessions = {S: (self.hours[S], self.session_course[S]) for S in self.sessions if S in set(sessions)}
+        pairs = [(C, K) for C in self.courses for K in self.course_cds[C]]
+        return Instance.build(sessions, dict(self.course_professor), self.professors, dict(self.cds_students), pairs,
+                              {R: self.capacity[R] for R in self.rooms if R in set(rooms)}, self.unavailable(rooms))
+
+    def unavailable(self, rooms = None) -> Dict:
+        """Return the availability calendars in the format taken by Instance.build (only the given rooms, if any)."""
+        rows = lambda calendar: [(i, day, hour) for (i, hours) in calendar.items() for (day, hour) in hours]
+        room_rows = rows(self.room_unavailable)
+        if rooms is not None:
+            rooms = set(rooms)
+            room_rows = [row for row in room_rows if row[0] in rooms]
+        return {'P': rows(self.professor_unavailable), 'R': room_rows, 'K': rows(self.cds_unavailable)}
+
+    def session_students(self, session) -> int:
+        """Return the number of students attending a session (N(G(S)))."""
+        return self.students.get(self.session_course[session], 0)
+
+    def ids(self) -> Dict:
+        """Return the IDs in the same format as SQLUtility.get_ids."""
+        return {
+            'Sessions': list(self.sessions),
+            'Courses': list(self.courses),
+            'Professors': list(self.professors),
+            'CdS': list(self.cds),
+            'Rooms': list(self.rooms),
+        }
@@ -0,0 +1,64 @@
+"""
+File containing the instrumentation of TimetableScheduler: timings of the phases and of the constraint families, size of
+the model, SQL queries and Z3 statistics, and the callbacks through which the scheduler reports its progress.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict
+
+@dataclass
+class Metrics:
+    """Measures collected by a TimetableScheduler (see TimetableScheduler.metrics). Timings are in seconds and add up
+    over repeated calls of the same phase (e.g. several .solve())."""
+
+    phases: Dict[str, float] = field(default_factory=dict)      # phase -> time (load, prune, variables, constraints, check, save, ...)
+    families: Dict[str, float] = field(default_factory=dict)    # constraint family -> time spent building and posting it
+    assertions: Dict[str, int] = field(default_factory=dict)    # constraint family -> number of assertions posted
+    variables: int = 0                                          # Z3 variables created by .start()
+    queries: int = 0                                            # SQL statements issued on the database
+    statistics: Dict = field(default_factory=dict)              # Z3 statistics of the last check
+
+    def __post_init__(self):
+        self.last = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block under the given phase."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - t0
+
+    def lap(self, family: str = None):
+        """Charge the time elapsed since the previous lap to a constraint family and count one assertion for it.
+        Called by TimetableScheduler.post, so that building a constraint is charged to its family; without a family
+        the clock is only reset."""
+        now = time.perf_counter()
+        if family is not None:
+            self.families[family] = self.families.get(family, 0) + now - self.last
+            self.assertions[family] = self.assertions.get(family, 0) + 1
+        self.last = now
+
+    def as_dict(self) -> Dict:
+        """Return the metrics as a plain dictionary (e.g. to be serialized as JSON)."""
+        return asdict(self)
+
+def print_callback(event: str, message: str, data: Dict):
+    """Default callback of TimetableScheduler: print the status messages and ignore the rest."""
+    if message is not None:
+        print(message)
+
+def logging_callback(logger: logging.Logger, level = logging.INFO):
+    """Return a callback sending the events of a TimetableScheduler to a logger. Events without a message (e.g. 'metrics')
+    are logged under their name; the event and its data are attached to the record as the attributes event and data.
+    Input:
+        logger (logging.Logger): destination of the records
+        level (int): level of the records
+    Output: callback to pass to TimetableScheduler"""
+    def callback(event, message, data):
+        logger.log(level, message if message is not None else event, extra={'event': event, 'data': data})
+    return callback
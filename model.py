@@ -4,26 +4,240 @@ File containing the Z3 model and its constraints. The solver is represented as a
 
 from z3 import * 
 import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from sql_utilities import SQLUtility
-import numpy as np 
+from metrics import Metrics, print_callback
+from cache import fingerprint, load_model, store_model, load_result, store_result
+from decomposition import decompose
+from feasibility import analyze
+from dimacs import compile_cnf, write_dimacs, run_solver, solve_cnf, to_model
+from batch import Builder
 import pandas as pd 
-from typing import Literal
-from weekplot import plotSchedule
+from typing import Callable, Dict, Literal, Optional
+from weekplot import COLORMAP, Event, plotEvents, renderSchedules
+import matplotlib.pyplot as plt
+
+# Default weights of the soft constraints of the optimization mode. They can be overridden per database (table
+# Preferences) and per scheduler (weights argument of TimetableScheduler).
+#   gaps:  every hour without lectures between two lectures of the same CdS in a day
+#   idle:  every idle hour between two sessions of the same professor in a day
+#   days:  every day in which a CdS has at least one lecture (prefer compact weeks)
+#   rooms: every room that is larger than needed, counted by how many sufficient rooms are smaller
+PREFERENCES = {'gaps': 4, 'idle': 2, 'days': 1, 'rooms': 1}
+
+# Default configurations raced by TimetableScheduler.solve_portfolio. Each one may override the encoding and the engine,
+# pick a solver for a given logic ('QF_FD' is Z3's SAT-based solver for finite domains) and set a random seed.
+PORTFOLIO = [
+    {'encoding': 'cardinality'},
+    {'encoding': 'cardinality', 'logic': 'QF_FD'},
+    {'encoding': 'pairwise'},
+    {'encoding': 'pairwise', 'logic': 'QF_FD'},
+    {'engine': 'integer'},
+    {'encoding': 'cardinality', 'seed': 1},
+    {'encoding': 'cardinality', 'logic': 'QF_FD', 'seed': 1},
+    {'encoding': 'cardinality', 'seed': 2},
+]
+
+# Z3's defaults of the budget parameters, i.e. no timeout and no resource limit (see TimetableScheduler.budget)
+NO_BUDGET = {'timeout': 4294967295, 'rlimit': 0}
+
+# view of the schedule -> column of TimetableScheduler.schedule_frame() selecting it
+VIEWS = {'cds': 'CdS', 'prof': 'Professor', 'room': 'Room', 'course': 'Course'}
+
+@dataclass
+class SolveResult:
+    """Outcome of a call to TimetableScheduler.solve (or .solve_portfolio)."""
+    status: str                         # 'sat', 'unsat' or 'unknown'
+    elapsed: float                      # wall-clock seconds spent in the solver
+    statistics: Dict = field(default_factory=dict)  # Z3 statistics of the check
+    reason: Optional[str] = None        # why the solver answered unknown (e.g. 'timeout', 'max. resource limit exceeded')
+    best_so_far: bool = False           # True if the saved schedule is the best one found before the budget ran out
+    configuration: Optional[Dict] = None  # winning configuration of a portfolio
+    objectives: Dict = field(default_factory=dict)  # value of every preference in the saved schedule (optimization mode)
+    cached: bool = False                # True if the answer comes from the result cache (no Z3 model is available)
+    violations: Dict = field(default_factory=dict)  # bounds violated by the instance, by family (see .feasibility_report())
+    weeks: Dict = field(default_factory=dict)  # week -> {'status', 'changes'} of a term (see .solve_term())
+
+# Exceptions of a week of a term (see TimetableScheduler.solve_term): kind -> what-if edit applying it
+TERM_EXCEPTIONS = {
+    'holiday': 'block_day',             # ('holiday', day)
+    'timeslot': 'block_timeslot',       # ('timeslot', T)
+    'room': 'block_room',               # ('room', R, timeslots), timeslots None for the whole week
+    'professor': 'block_professor',     # ('professor', P, timeslots)
+    'cancel': 'remove_session',         # ('cancel', S), requires incremental=True
+    'pin': 'pin',                       # ('pin', S, T, R)
+}
+
+def portfolio_worker(task):
+    """Build and solve one configuration of a portfolio in a separate process (see TimetableScheduler.solve_portfolio).
+    Input: task (Tuple): (index, database name, timeslots per day, t_start, constructor options, configuration, SMT-LIB2
+           text of the custom constraints, budget, sessions added by .add_session())
+    Output: (index, answer as a string, list of (session, timeslot, room) triples or None, statistics, values of the
+            preferences)"""
+    (index, fname, timeslots_per_day, t_start, flags, config, custom, budget, added) = task
+
+    flags = dict(flags)
+    flags.update({k: config[k] for k in ['encoding', 'engine'] if k in config})
+    scheduler = TimetableScheduler(fname, timeslots_per_day, t_start, **flags)
+    if 'logic' in config:
+        scheduler.solver = SolverFor(config['logic'])
+    if 'seed' in config:
+        scheduler.solver.set("random_seed", config['seed'])
+    scheduler.set_budget(*budget)
+
+    scheduler.start()
+    scheduler.add_constraints()
+    if scheduler.violations:
+        scheduler.end()
+        return (index, 'unsat', None, {}, {})
+    # the constraints of the added sessions come with the custom ones, only their variables are needed
+    for (S, (course, hours)) in added.items():
+        scheduler.include_session(S, course, hours)
+    if custom:
+        scheduler.solver.from_string(custom)
+
+    answer = scheduler.solver.check(*scheduler.assumptions())
+    rows = None
+    objectives = {}
+    if answer == sat:
+        scheduler.model = scheduler.solver.model()
+        rows = scheduler.extract_schedule()
+        if scheduler.optimize:
+            objectives = scheduler.objective_values()
+    statistics = scheduler.statistics()
+    scheduler.end()
+
+    return (index, str(answer), rows, statistics, objectives)
+
+def decomposition_worker(task):
+    """Build and solve the model restricted to some sessions and rooms in a separate process (see
+    TimetableScheduler.solve_decomposed).
+    Input: task (Tuple): (database name, timeslots per day, t_start, constructor options, sessions, rooms, budget)
+    Output: (answer as a string, list of (session, timeslot, room) triples or None)"""
+    (fname, timeslots_per_day, t_start, flags, sessions, rooms, budget) = task
+
+    scheduler = TimetableScheduler(fname, timeslots_per_day, t_start, **flags)
+    scheduler.set_budget(*budget)
+    scheduler.start(sessions, rooms)
+    scheduler.add_constraints()
+    if scheduler.violations:
+        # the part cannot be solved with its share of the rooms
+        scheduler.end()
+        return ('unsat', None)
+
+    answer = scheduler.solver.check(*scheduler.assumptions())
+    rows = None
+    if answer == sat:
+        scheduler.model = scheduler.solver.model()
+        rows = scheduler.extract_schedule()
+    scheduler.end()
+
+    return (str(answer), rows)
+
+class SparseVars(dict):
+    """Dictionary of decision variables holding only the feasible (session, timeslot, room) triples.
+    Looking up a pruned triple returns the constant False, so custom constraints can still be written over the full
+    Sessions x T x Rooms product."""
+
+    def __missing__(self, key):
+        return BoolVal(False)
 
 class TimetableScheduler():
-    def __init__(self, fname: str, timeslots_per_day: int, t_start = 8, t_end = None, optional_constraints = False):
-        """Initialize the scheduler with database filename, timeslots per day, start/end times, and other flags."""
+    def __init__(self, fname: str, timeslots_per_day: int, t_start = 8, t_end = None, optional_constraints = False,
+                 encoding: Literal['pairwise', 'cardinality'] = 'pairwise', engine: Literal['boolean', 'integer'] = 'boolean',
+                 track = False, timeout = None, rlimit = None, optimize = False, weights: Optional[Dict] = None,
+                 priority: Literal['weighted', 'lex'] = 'weighted', incremental = False, symmetry_breaking = False,
+                 callback: Optional[Callable] = print_callback, cache = False, cache_results = False, precheck = True):
+        """Initialize the scheduler with database filename, timeslots per day, start/end times, and other flags.
+        encoding selects how C1, C3, C4 and C7 are posted: 'pairwise' follows the formulation literally (one implication
+        per session), 'cardinality' posts a single AtMost(..., 1) per room-slot, (professor, slot), (CdS, slot) and
+        (session, slot) group, so that the number of terms grows linearly in |S|*|T|*|A|.
+        engine selects the model: 'boolean' is the X/Y grid of the formulation, 'integer' gives every session an integer
+        day, start offset and room, and expresses C1, C3 and C4 as pairwise no-overlap disjunctions (X and Y are then
+        not available for custom constraints; use .Start, .Day and .Room instead).
+
+        track enables unsat-core tracking: every constraint is posted with assert_and_track under a label naming its
+        family (C1...C7, OPTIONAL) and indexes. It is off by default, since the tracking literals slow down production
+        solves; an unsat answer can still be explained afterwards with .diagnose().
+
+        timeout (milliseconds of wall-clock time) and rlimit (Z3 resource units, deterministic across machines) bound every
+        call to .solve(); when a budget runs out the solver answers unknown instead of blocking.
+
+        optimize switches to a Z3 Optimize solver and adds the preferences of PREFERENCES as weighted soft constraints
+        (boolean engine only). The weights are read from the Preferences table of the database, if any, and then from
+        weights. priority='weighted' minimizes the weighted sum of all preferences, priority='lex' minimizes them one at
+        a time, from the heaviest to the lightest.
+
+        incremental guards C6 with one literal per session, assumed at every check, so that sessions of the database can
+        be removed by .remove_session() without rebuilding the model. The other what-if edits (.add_session(),
+        .block_room(), .block_timeslot(), .block_professor(), .pin()) are available in any case with the boolean engine.
+        When incremental is on, call .solve() (or pass .assumptions() to .solver.check()) rather than .solver.check().
+
+        symmetry_breaking orders interchangeable sessions and rooms (boolean engine, see .add_symmetry_breaking()). The
+        ordering constraints are guarded by a literal assumed only while no what-if edit is applied, since an edit can
+        single out one member of a class; custom constraints doing the same (e.g. fixing one of two equal rooms) are not
+        detected and may turn a feasible problem into an unsat one.
+
+        callback receives the progress of the scheduler as callback(event, message, data): message is the status line
+        printed by default (None for events only meant for monitoring, like 'metrics') and data a dictionary with the
+        details. See metrics.print_callback (default) and metrics.logging_callback; None silences the scheduler. The
+        timings of the phases and of the constraint families, the size of the model, the SQL queries and the Z3
+        statistics are collected in .metrics (see metrics.Metrics) and sent with the 'metrics' event after every solve.
+
+        cache stores the formula built by .add_constraints() as SMT-LIB2 in ./cache/, under a hash of the instance and of
+        the flags (see cache.py); later runs on the same data parse the file instead of building the constraints again.
+        It is not used in track mode (labels) nor in optimization mode (objectives), where the model is always built.
+
+        cache_results makes .solve() look up its answer in ./cache/results/ before calling Z3, under a hash of the instance,
+        of the flags, of the custom constraints and of the applied edits; sat and unsat answers are stored there, and a
+        hit writes the cached schedule to SCHEDULE without touching the solver (.model stays None). Not used in track mode
+        nor by .repair().
+
+        precheck runs the counting and matching bounds of feasibility.analyze before the model is built. If one of them is
+        violated the instance is infeasible: the model is not built and the solve methods answer unsat at once, reporting
+        the violations. Turn it off to build the model anyway (e.g. to try what-if edits that would fix the instance)."""
+
+        if encoding not in ['pairwise', 'cardinality']:
+            raise Exception("INVALID ENCODING")
+        if engine not in ['boolean', 'integer']:
+            raise Exception("INVALID ENGINE")
+        if priority not in ['weighted', 'lex']:
+            raise Exception("INVALID PRIORITY")
+        if optimize and engine != 'boolean':
+            raise Exception("THE OPTIMIZATION MODE IS ONLY AVAILABLE WITH THE BOOLEAN ENGINE")
 
         self.timeslots_per_day = timeslots_per_day
         self.fname = fname
         self.days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
         self.optional_constraints = optional_constraints
+        self.encoding = encoding
+        self.engine = engine
+        self.track = track
+        self.timeout = timeout
+        self.rlimit = rlimit
+        self.limits = dict()  # budget parameter -> value set on .solver by .set_budget()
+        self.optimize = optimize
+        self.weights = weights
+        self.priority = priority
+        self.incremental = incremental
+        self.symmetry_breaking = symmetry_breaking
+        self.callback = callback
+        self.cache = cache
+        self.cache_results = cache_results
+        self.precheck = precheck
+        self.violations = [] # (family, indexes, detail) of the bounds violated by the instance (see .add_constraints())
+        self.metrics = Metrics()
 
         if t_end == None:
             t_end = t_start + timeslots_per_day
 
         if t_end - t_start < 0 or t_end - t_start != timeslots_per_day or not(t_start in range(0, 24)) or not (t_end in range(0,24)):
-            print("WARNING: INVALID INPUT DETECTED WITH T_START AND T_END. ROLLING BACK TO DEFAULT PARAMETERS")
+            self.emit('warning', "WARNING: INVALID INPUT DETECTED WITH T_START AND T_END. ROLLING BACK TO DEFAULT PARAMETERS")
             t_start = 8
             t_end = 8 + timeslots_per_day
 
@@ -33,135 +247,668 @@ class TimetableScheduler():
 
         self.t_start = t_start
 
-        self.solver = Solver()
+        self.solver = Optimize() if optimize else Solver()
+        self.builder = Builder(self.solver.ctx) # builds the X/Y model through the Z3 C API (see batch.py)
+        if optimize:
+            self.solver.set(priority=priority)
         self.model = None
+        self.cached_rows = None # rows of the last answer of the result cache, which has no model (see .solve_cached())
+        self.posted = (0, 0) # range of the solver's assertions posted by .add_constraints(); the others are custom ones
+        self.core = None
+        self.objectives = dict() # preference -> list of (penalty literal, weight)
+        self.flags = {'optional_constraints': optional_constraints, 'encoding': encoding, 'engine': engine, 'incremental': incremental,
+                      'symmetry_breaking': symmetry_breaking, 'cache': cache}
+        # everything the workers of .solve_portfolio() and .solve_decomposed() need to build the same model
+        self.options = dict(self.flags, optimize=optimize, weights=weights, priority=priority, track=track, precheck=precheck)
+        self.added = dict()  # session added by .add_session() -> (course, hours)
+        self.symmetry = Bool('SYMMETRY') # literal enabling the symmetry breaking constraints
+        self.active = dict() # session -> literal enabling its C6 (incremental mode)
+        self.edits = dict()  # edit ID -> (description, literal assumed while the edit is applied, applied?, formulas posted,
+                             # literal assumed false while the edit is undone?)
+        self.term_edits = dict()  # exception of a week of a term -> ID of the edit applying it (see .solve_term())
 
-        self.X = dict()
-        self.Y = dict()
+        self.X = SparseVars()
+        self.Y = SparseVars()
+        self.starts = dict()  # session -> its keys (session, start, room) of Y, in order, see .extract_schedule()
+        self.domains = dict()   # session -> (feasible start slots, feasible rooms)
+        self.unavailable = dict()  # 'P', 'R', 'K' -> professor, room, CdS -> timeslots it is unavailable in (see .prune())
+        self.rooms_at = dict()  # (session, timeslot) -> rooms with an X variable
+        self.sessions_at = dict()  # (timeslot, room) -> sessions with an X variable
+        self.Start = dict()  # session -> integer start timeslot (integer engine)
+        self.Day = dict()    # session -> integer day (integer engine)
+        self.Room = dict()   # session -> integer room ID (integer engine)
         self.indexes = dict()
         self.T = list(range(timeslots_per_day*6)) # Ammettiamo che si facciano lezioni dal lunedì al sabato (se non vuole che si faccia il sabato basta aggiungere manualmente ulteriori vincoli)
 
         self.database = None
+        self.instance = None
 
         self.started = False
         self.posed = False
 
-    def start(self):
-        """Connect to the SQL database and initialize variables for all sessions, times, and rooms."""
-        self.database = SQLUtility(self.fname)
-        self.database.start()
-        self.indexes = self.database.get_ids()
+    def start(self, sessions = None, rooms = None):
+        """Connect to the SQL database, prune the infeasible (session, start, room) triples and initialize the variables
+        of the remaining ones. The model can be restricted to some sessions and rooms (used by .solve_decomposed())."""
+        with self.metrics.phase('load'):
+            self.database = SQLUtility(self.fname)
+            self.database.start()
+            self.instance = self.database.load_instance()
+            if sessions is not None or rooms is not None:
+                self.instance = self.instance.restrict(
+                    self.instance.sessions if sessions is None else sessions,
+                    self.instance.rooms if rooms is None else rooms
+                )
+            self.indexes = self.instance.ids()
 
-        # fill variables with indexes
-        for (S,T,R) in itertools.product(self.indexes["Sessions"], self.T, self.indexes["Rooms"]):
-            idx_string = f"{S}%{T}%{R}"
-            self.X[S,T,R] = Bool(f'X_{idx_string}')
-            self.Y[S,T,R] = Bool(f'Y_{idx_string}')
+        with self.metrics.phase('prune'):
+            self.prune()
 
+        with self.metrics.phase('variables'):
+            if self.engine == 'integer':
+                for S in self.indexes["Sessions"]:
+                    self.Start[S] = Int(f'Start_{S}')
+                    self.Day[S] = Int(f'Day_{S}')
+                    self.Room[S] = Int(f'Room_{S}')
+                self.metrics.variables = 3*len(self.indexes["Sessions"])
+            else:
+                # fill variables with indexes, only for the feasible triples
+                for S in self.indexes["Sessions"]:
+                    self.create_variables(S)
+                self.metrics.variables = len(self.X) + len(self.Y) + len(self.active)
+
+        self.metrics.queries = self.database.queries
         self.started = True
 
+    def create_variables(self, S):
+        """Create the X and Y variables of a session for its feasible triples (see .prune())."""
+        (starts, rooms) = self.domains[S]
+        blocked = self.unavailable['R']
+        triples = [(S,T,R) for (T,R) in itertools.product(starts, rooms)
+                   if not any(T+k in blocked.get(R, ()) for k in range(self.instance.hours[S]))]
+        ys = self.builder.variables(f'Y_{S}%{T}%{R}' for (S,T,R) in triples)
+        self.Y.update(zip(triples, ys))
+        self.starts[S] = triples
+
+        # the slots covered by the starts, in order of first appearance
+        covered = [x for x in dict.fromkeys((S,T+k,R) for (S,T,R) in triples for k in range(self.instance.hours[S])) if x not in self.X]
+        self.X.update(zip(covered, self.builder.variables(f'X_{S}%{T}%{R}' for (S,T,R) in covered)))
+        for (S,T,R) in covered:
+            self.rooms_at.setdefault((S,T), []).append(R)
+            self.sessions_at.setdefault((T,R), []).append(S)
+        if self.incremental:
+            self.active[S] = Bool(f'C6-S={S}%part=active')
+
+    def prune(self, sessions = None):
+        """Compute, for every session, the start slots and the rooms it can use (C2 and C5 checked statically):
+        a session can only start if it ends within the same day, and can only use rooms with enough capacity. The
+        starts covering an hour in which the professor or one of the CdS of the session is unavailable are removed too;
+        the hours in which a room is unavailable are removed by .create_variables(), per (start, room) pair."""
+        self.unavailable = self.unavailable_timeslots()
+        instance = self.instance
+        for S in (self.indexes["Sessions"] if sessions is None else sessions):
+            S_h = instance.hours[S]
+            blocked = self.unavailable['P'].get(instance.professor[S], set()).union(
+                *[self.unavailable['K'].get(K, ()) for K in instance.course_cds.get(instance.session_course[S], ())])
+            starts = tuple(T for T in self.T if (T % self.timeslots_per_day) + S_h <= self.timeslots_per_day
+                           and not any(T+k in blocked for k in range(S_h)))
+            rooms = tuple(R for R in self.indexes["Rooms"] if instance.session_students(S) <= instance.capacity[R])
+            self.domains[S] = (starts, rooms)
+
+    def unavailable_timeslots(self) -> Dict:
+        """Return the timeslots in which the professors, the rooms and the CdS are unavailable, from the (day, hour) pairs
+        of the availability calendars of the instance; the hours outside the day of the scheduler are ignored.
+        Output: {'P': professor -> set of timeslots, 'R': room -> set of timeslots, 'K': CdS -> set of timeslots}"""
+        r = self.timeslots_per_day
+        timeslots = lambda calendar: {i: {day*r + hour - self.t_start for (day, hour) in hours
+                                          if 0 <= day < 6 and 0 <= hour - self.t_start < r} for (i, hours) in calendar.items()}
+        return {'P': timeslots(self.instance.professor_unavailable), 'R': timeslots(self.instance.room_unavailable),
+                'K': timeslots(self.instance.cds_unavailable)}
+
     def add_constraints(self):
-        """Add all scheduling constraints to the Z3 solver."""
+        """Add all scheduling constraints to the Z3 solver, using the model selected by the engine flag."""
         if not self.check():
             return -1
 
+        if self.precheck:
+            with self.metrics.phase('precheck'):
+                self.violations = analyze(self.instance, self.timeslots_per_day, self.domains, self.optional_constraints,
+                                          unavailable=self.unavailable)
+            if self.violations:
+                report = self.feasibility_report()
+                self.emit('infeasible', "THE INSTANCE IS INFEASIBLE, THE MODEL IS NOT BUILT:\n" + "\n".join(
+                    f"{family}: {v}" for (family, lines) in report.items() for v in lines), violations=report)
+                self.posed = True
+                return
+
+        first = len(self.solver.assertions())
+        key = self.cache_key() if self.cache and not self.track and not self.optimize else None
+        cached = load_model(key) if key is not None else None
+        if cached is not None:
+            with self.metrics.phase('cache'):
+                self.solver.from_file(cached)
+            self.emit('cache', None, hit=True, key=key)
+        else:
+            with self.metrics.phase('constraints'):
+                self.metrics.lap()
+                if self.engine == 'integer':
+                    self.add_integer_constraints()
+                else:
+                    self.add_boolean_constraints()
+            if key is not None:
+                with self.metrics.phase('cache'):
+                    store_model(key, list(self.solver.assertions())[first:])
+                self.emit('cache', None, hit=False, key=key)
+        if self.optimize:
+            with self.metrics.phase('preferences'):
+                self.add_preferences()
+        self.posted = (first, len(self.solver.assertions()))
+        self.metrics.queries = self.database.queries
+
+        self.posed = True
+
+    def feasibility_report(self) -> Dict:
+        """Return the bounds violated by the instance (see feasibility.analyze) as readable descriptions, by family."""
+        names = self.database.get_names()
+        report = {}
+        for (family, where, detail) in self.violations:
+            place = self.describe(where, names)
+            report.setdefault(family, []).append(f"{place}: {detail}" if place else detail)
+        return report
+
+    def infeasible(self):
+        """Answer a solve of an instance violating the pre-checks, without calling Z3."""
+        result = SolveResult('unsat', 0, reason='precheck', violations=self.feasibility_report())
+        self.emit('unsat', "NO TIME TABLE EXISTS (the instance violates the pre-checks)", elapsed=0, violations=result.violations)
+        self.report_metrics(result)
+        return result
+
+    def cache_key(self) -> str:
+        """Return the key of the formula built by .add_constraints() in the model cache (see cache.fingerprint)."""
+        flags = {k: v for (k, v) in self.flags.items() if k != 'cache'}
+        # t_start maps the hours of the availability calendars to timeslots (see .unavailable_timeslots())
+        return fingerprint(self.instance, {'timeslots_per_day': self.timeslots_per_day, 't_start': self.t_start, 'flags': flags})
+
+    def result_key(self) -> str:
+        """Return the key of the answer of .solve() in the result cache: besides the formula, it depends on the custom
+        constraints, on the assumed literals and on the preferences."""
+        custom = Solver()
+        custom.add(self.custom_constraints())
+        parameters = {
+            'timeslots_per_day': self.timeslots_per_day,
+            't_start': self.t_start,
+            'flags': {k: v for (k, v) in self.flags.items() if k != 'cache'},
+            'custom': custom.sexpr(),
+            'assumptions': sorted(str(a) for a in self.assumptions()),
+        }
+        if self.optimize:
+            weights = dict(PREFERENCES)
+            weights.update(self.database.get_preferences())
+            weights.update(self.weights or {})
+            parameters.update({'weights': weights, 'priority': self.priority})
+        return fingerprint(self.instance, parameters)
+
+    def post(self, constraint, family, **where):
+        """Add a constraint (a BoolRef, or a raw AST built by .builder) to the solver. In track mode the constraint is
+        tracked under a label built from its family and indexes, e.g. 'C1-S=3%T=10%R=2' (S: session, T: timeslot, R: room,
+        P: professor, K: CdS, C: course, D: day)."""
+        if self.track:
+            self.solver.assert_and_track(self.builder.wrap(constraint), f"{family}-" + "%".join(f"{k}={v}" for (k, v) in where.items()))
+            self.builder.release()
+        else:
+            self.builder.add(self.solver, constraint)
+        self.metrics.lap(family)
+
+    def emit(self, event, message = None, **data):
+        """Report an event through the callback given to the constructor (see metrics.print_callback)."""
+        if self.callback is not None:
+            self.callback(event, message, data)
+
+    def save(self, rows, message = "Saving the schedule in the SQL Database..."):
+        """Store (session, timeslot, room) rows in the SCHEDULE table, reporting the progress through the callback."""
+        self.emit('saving', message)
+        with self.metrics.phase('save'):
+            self.database.save_schedule(rows)
+        self.emit('saved', "Schedule saved", rows=len(rows))
+
+    def report_metrics(self, result):
+        """Copy the statistics of a solve into .metrics and send them with the 'metrics' event."""
+        self.metrics.statistics = result.statistics
+        self.metrics.queries = self.database.queries
+        self.emit('metrics', metrics=self.metrics.as_dict(), status=result.status)
+
+    def add_boolean_constraints(self):
+        """Post the constraints of the X/Y formulation. Only the variables created by .start() are constrained:
+        C5 and the day/week overflow part of C2 already hold by construction. The terms are built on the raw ASTs of the
+        variables through .builder (see batch.py), the negations of the X variables once for all the constraints."""
+        instance = self.instance
+        pairwise = self.encoding == 'pairwise'
+        b = self.builder
+        X = b.raw(self.X)
+        Y = b.raw(self.Y)
+        notX = b.negations(self.X) if pairwise else None
+
         # C1: No more than two sessions in the same room, C2: Sessions must be contiguous
         # C7: A session happens only in one room
-        for (S,T, R) in itertools.product(self.indexes["Sessions"], self.T, self.indexes["Rooms"]):
-            self.solver.assert_and_track(
-                Implies(
-                    self.X[S,T,R], 
-                    And([Not(self.X[Si, T, R]) for Si in self.indexes["Sessions"] if Si != S])
-                    ),
-                    f'C1-{S}%{T}%{R}'
-                )
-            
-            # C7
-            self.solver.assert_and_track(
-                Implies(
-                    self.X[S, T, R],
-                    And( [ Not(self.X[S, T, Ai]) for Ai in self.indexes['Rooms'] if Ai != R ] )
+        for (S,T,R) in X:
+            if pairwise:
+                others = [notX[Si, T, R] for Si in self.sessions_at[T,R] if Si != S]
+                if others:
+                    self.post(
+                        b.implies(X[S,T,R], b.and_(others)),
+                        'C1', S=S, T=T, R=R
+                    )
+                
+                # C7
+                others = [notX[S, T, Ai] for Ai in self.rooms_at[S,T] if Ai != R]
+                if others:
+                    self.post(
+                        b.implies(X[S, T, R], b.and_(others)),
+                        'C7', S=S, T=T, R=R
+                    )
+
+            # C2 (converse): a slot is occupied only if the session started in the same room at most H(S)-1 slots before,
+            # on the same day. Without it the solver is free to switch on spare X variables that do not belong to any session.
+            S_h = instance.hours[S]
+            day_start = (T // self.timeslots_per_day) * self.timeslots_per_day
+            self.post(
+                b.implies(
+                    X[S,T,R],
+                    b.or_( [ Y[S,t,R] for t in range(max(day_start, T-S_h+1), T+1) if (S,t,R) in Y ] )
                 ),
-                f"C7-{S}%{T}%{R}"
+                'C2', S=S, T=T, R=R, part='converse'
             )
-            
-            # C2: modified
-            S_h = self.database.get_hours(S)
-
-            if T+S_h-1 > max(self.T) or ((T+S_h-1) // self.timeslots_per_day) != (T//self.timeslots_per_day):
-                self.solver.assert_and_track(
-                        Not(self.Y[S,T,R]),
-                    f"noC2-{S}%{T}%{R}"
-                )
-            else:
-                self.solver.assert_and_track(
-                    Implies(
-                        self.Y[S,T,R],
-                        And(
-                            [ self.X[S,T+k, R] for k in range(0, S_h) ]
-                        )
-                    ),
-                        f"C2-{S}%{T}%{R}"
-                )
 
+        # C2: modified
+        for (S,T,R) in Y:
+            self.post(
+                b.implies(
+                    Y[S,T,R],
+                    b.and_(
+                        [ X[S,T+k, R] for k in range(0, instance.hours[S]) ]
+                    )
+                ),
+                    'C2', S=S, T=T, R=R
+            )
 
         # C3: A professor can have only one session at the same time
         # C4: There cannot be >=2 sessions of courses belonging to the same CdS in the same timeslot (and any room) 
-        for (S,T) in itertools.product(self.indexes['Sessions'], self.T):
-            self.solver.assert_and_track(
-                Implies(
-                    Or( [ self.X[S, T, A] for A in self.indexes['Rooms'] ]),
-                    And([ Not(self.X[Si, T, Ai]) for (Si, Ai) in itertools.product(self.indexes['Sessions'], self.indexes['Rooms']) if (Si != S and self.database.get_professor(S) == self.database.get_professor(Si)) ])
-                ),
-                f'C3-{S}%{T}'
-            )
-            
-
-            self.solver.assert_and_track(
-                Implies(
-                    Or(
-                        [ self.X[S,T,A] for A in self.indexes['Rooms'] ]
-                    ),
-                    And(
-                        ([ Not(self.X[Si, T, Ai]) for (Si, Ai) in itertools.product(self.database.get_other_session_courses(S), self.indexes['Rooms'])  ])
-                    )),
-                f'C4-{S}%{T}'
-            )      
-            
-
-        # C5: Rooms must be able to accomodate all students
-        for (S,A) in itertools.product(self.indexes['Sessions'], self.indexes['Rooms']):
-            self.solver.assert_and_track(
-                Implies(
-                    Or( [ self.X[S,T,A] for T in self.T ] ),
-                    self.database.get_total_students(self.database.get_course(S)) <= self.database.get_capacity(A)
-                ),
-                f'c5-{S}%{A}'
-            )
+        if pairwise:
+            for (S,T) in self.rooms_at:
+                others = [ notX[Si, T, Ai] for Si in instance.professor_sessions[instance.professor[S]] if Si != S for Ai in self.rooms_at.get((Si,T), []) ]
+                if others:
+                    self.post(
+                        b.implies(
+                            b.or_( [ X[S, T, A] for A in self.rooms_at[S,T] ]),
+                            b.and_(others)
+                        ),
+                        'C3', S=S, T=T
+                    )
+                
+                others = [ notX[Si, T, Ai] for Si in instance.conflicts[S] for Ai in self.rooms_at.get((Si,T), []) ]
+                if others:
+                    self.post(
+                        b.implies(
+                            b.or_( [ X[S,T,A] for A in self.rooms_at[S,T] ] ),
+                            b.and_(others)
+                        ),
+                        'C4', S=S, T=T
+                    )      
+        else:
+            # Same constraints as above, grouped: every room-slot, (professor, slot), (CdS, slot) and (session, slot)
+            # hosts at most one X. Groups made of a single session are already covered by C7 and are skipped.
+            for ((T,R), sessions) in self.sessions_at.items():
+                if len(sessions) < 2:
+                    continue
+                self.post(
+                    b.atmost( [X[S,T,R] for S in sessions], 1),
+                    'C1', T=T, R=R
+                )
+
+            for ((S,T), rooms) in self.rooms_at.items():
+                if len(rooms) < 2:
+                    continue
+                self.post(
+                    b.atmost( [X[S,T,R] for R in rooms], 1),
+                    'C7', S=S, T=T
+                )
+
+            groups = [('C3', {'P': P}, instance.professor_sessions[P]) for P in self.indexes['Professors']] + \
+                     [('C4', {'K': K}, instance.cds_sessions[K]) for K in self.indexes['CdS']]
+            for ((family, key, sessions), T) in itertools.product(groups, self.T):
+                xs = [ X[S,T,R] for S in sessions for R in self.rooms_at.get((S,T), []) ]
+                if len({S for S in sessions if (S,T) in self.rooms_at}) < 2:
+                    continue
+                self.post(
+                    b.atmost( xs, 1),
+                    family, T=T, **key
+                )
+
+        # C5: Rooms must be able to accomodate all students. Rooms that are too small never get a variable (see .prune()),
+        # so the constraint only has to be posted for sessions left with no room at all.
+        for S in self.indexes['Sessions']:
+            if not self.domains[S][1]:
+                self.post(BoolVal(False), 'C5', S=S)
 
         # C6: Every session must be organized exactly only one time (i.e. the amount of hours are exactly right)
         for S in self.indexes['Sessions']:
-            self.solver.assert_and_track(
-                AtMost( *[self.Y[S, T, R] for (T,R) in itertools.product(self.T, self.indexes['Rooms'])], 1),
-                f'A-C6-{S}'
-            )
-            self.solver.assert_and_track(
-                AtLeast( *[self.Y[S, T, R] for (T,R) in itertools.product(self.T, self.indexes['Rooms'])], 1),
-                f'B-C6-{S}'
+            if S in self.added:
+                # posted by its what-if edit, which may be undone (see .add_session() and .diagnose())
+                continue
+            ys = [Y[S, T, R] for (T,R) in itertools.product(*self.domains[S]) if (S,T,R) in Y]
+            if not ys:
+                # also reached when the session is longer than a day (noC2)
+                self.post(BoolVal(False), 'C6', S=S, part='min')
+                continue
+            self.post(
+                b.atmost( ys, 1),
+                'C6', S=S, part='max'
             )
+            if self.incremental:
+                # the session can be switched off by assuming Not(active[S]) (see .remove_session())
+                active = self.active[S].as_ast()
+                self.post(b.implies(active, b.atleast( ys, 1)), 'C6', S=S, part='min')
+                self.post(b.implies(b.not_(active), b.not_(b.or_(ys))), 'C6', S=S, part='off')
+            else:
+                self.post(
+                    b.atleast( ys, 1),
+                    'C6', S=S, part='min'
+                )
 
         if self.optional_constraints:
             for (i,j) in itertools.product(self.indexes['Courses'], [0,1,2,3,4,5]):
-                self.solver.assert_and_track(
-                    AtMost(
-                        *[self.Y[S,T,V] for (S,T,V) in itertools.product(self.database.get_sessions(i), range(j*self.timeslots_per_day, j*self.timeslots_per_day+self.timeslots_per_day), self.indexes['Rooms'])],
-                        1
-                    ),
-                    f"OPTIONAL-{i}%{j}"
+                ys = [Y[S,T,V] for (S,T,V) in itertools.product(instance.course_sessions[i], range(j*self.timeslots_per_day, j*self.timeslots_per_day+self.timeslots_per_day), self.indexes['Rooms']) if (S,T,V) in Y]
+                if len(ys) < 2:
+                    continue
+                self.post(
+                    b.atmost(ys, 1),
+                    'OPTIONAL', C=i, D=j
                 ) 
 
+        # the asserted terms are now referenced by the solver
+        b.release(negations=True)
 
-        self.posed = True
+        if self.symmetry_breaking:
+            self.add_symmetry_breaking()
+
+    def add_symmetry_breaking(self):
+        """Post ordering constraints on the Y variables of interchangeable sessions and rooms, so that the solver does not
+        explore equivalent timetables. Classes are detected from the variables left after pruning:
+        - sessions of the same course with the same hours and the same feasible (start, room) pairs are ordered by start
+          timeslot (they share the professor, so they never start together);
+        - rooms with the same capacity and the same feasible (session, start) pairs are ordered by first use: a room can
+          start a session at T only if the previous room of its class has started one at T or before.
+        The room order only looks at which (start, room) pairs are taken, not by which session, so the two orderings can
+        be posted together. With the optimization mode rooms are not ordered, since the room preference ranks them."""
+        instance = self.instance
+        by_session = {}
+        by_room = {}
+        for (S,T,R) in self.Y:
+            by_session.setdefault(S, []).append((T, R))
+            by_room.setdefault(R, []).append((S, T))
+
+        def prefix(ys, tag):
+            # seen[T]: one of the ys (indexed by timeslot) is true at T or before
+            seen = {-1: BoolVal(False)}
+            for T in self.T:
+                seen[T] = Bool(f'sym_{tag}%{T}')
+                self.post(seen[T] == Or([seen[T-1]] + ys.get(T, [])), 'SYMMETRY', part=tag, T=T)
+            return seen
+
+        classes = {}
+        for S in self.indexes['Sessions']:
+            if S in by_session:
+                key = (instance.session_course[S], instance.hours[S], frozenset(by_session[S]))
+                classes.setdefault(key, []).append(S)
+        for sessions in classes.values():
+            for (a, b) in zip(sessions, sessions[1:]):
+                ys = {}
+                for (T, R) in by_session[a]:
+                    ys.setdefault(T, []).append(self.Y[a,T,R])
+                started = prefix(ys, f'S{a}')
+                for (T, R) in by_session[b]:
+                    self.post(Implies(self.symmetry, Implies(self.Y[b,T,R], started[T-1])), 'SYMMETRY', S=b, T=T, R=R)
+
+        if self.optimize:
+            return
+
+        classes = {}
+        for R in self.indexes['Rooms']:
+            if R in by_room:
+                classes.setdefault((instance.capacity[R], frozenset(by_room[R])), []).append(R)
+        for rooms in classes.values():
+            for (a, b) in zip(rooms, rooms[1:]):
+                ys = {}
+                for (S, T) in by_room[a]:
+                    ys.setdefault(T, []).append(self.Y[S,T,a])
+                opened = prefix(ys, f'R{a}')
+                for (S, T) in by_room[b]:
+                    self.post(Implies(self.symmetry, Implies(self.Y[S,T,b], opened[T])), 'SYMMETRY', S=S, T=T, R=b)
+
+    def add_integer_constraints(self):
+        """Post the constraints of the integer formulation: every session S starts at Start[S] = Day[S]*r + offset and
+        takes place in room Room[S], so C2, C6 and C7 hold by construction and only the no-overlap conditions are posted."""
+        instance = self.instance
+        sessions = self.indexes['Sessions']
+        r = self.timeslots_per_day
+
+        # C2, C5: the session fits in the day, the room has enough capacity
+        for S in sessions:
+            S_h = instance.hours[S]
+            rooms = self.domains[S][1]
+            self.post(
+                And(
+                    0 <= self.Day[S], self.Day[S] < 6,
+                    r*self.Day[S] <= self.Start[S], self.Start[S] + S_h <= r*self.Day[S] + r
+                ),
+                'C2', S=S
+            )
+            self.post(
+                Or( [ self.Room[S] == R for R in rooms ] ),
+                'C5', S=S
+            )
+
+        # AVAILABILITY: the session does not cover an hour in which its professor, one of its CdS or its room is
+        # unavailable (the boolean engine does not create the variables of those hours, see .prune())
+        for S in sessions:
+            (starts, rooms) = self.domains[S]
+            S_h = instance.hours[S]
+            if len(starts) < len([T for T in self.T if (T % r) + S_h <= r]):
+                self.post(Or( [ self.Start[S] == T for T in starts ] ), 'AVAILABILITY', S=S)
+            for R in rooms:
+                blocked = [T for T in starts if any(T+k in self.unavailable['R'].get(R, ()) for k in range(S_h))]
+                if blocked:
+                    self.post(
+                        Or(self.Room[S] != R, And( [ self.Start[S] != T for T in blocked ] )),
+                        'AVAILABILITY', S=S, R=R
+                    )
+
+        # C1, C3, C4: two sessions sharing a room, a professor or a CdS cannot overlap
+        for (i, S) in enumerate(sessions):
+            for Si in sessions[i+1:]:
+                disjoint = Or(
+                    self.Start[S] + instance.hours[S] <= self.Start[Si],
+                    self.Start[Si] + instance.hours[Si] <= self.Start[S]
+                )
+
+                if instance.professor[S] == instance.professor[Si]:
+                    self.post(disjoint, 'C3', S=S, S2=Si)
+                elif Si in instance.conflicts[S]:
+                    self.post(disjoint, 'C4', S=S, S2=Si)
+                elif set(self.domains[S][1]) & set(self.domains[Si][1]):
+                    self.post(
+                        Or(self.Room[S] != self.Room[Si], disjoint),
+                        'C1', S=S, S2=Si
+                    )
+
+        if self.optional_constraints:
+            for i in self.indexes['Courses']:
+                course_sessions = instance.course_sessions[i]
+                if len(course_sessions) < 2:
+                    continue
+                self.post(
+                    Distinct( [ self.Day[S] for S in course_sessions ] ),
+                    'OPTIONAL', C=i
+                )
+
+    def add_preferences(self):
+        """Post the preferences as soft constraints on the Optimize solver. Every penalty is an auxiliary Bool defined by
+        equivalence from the X/Y variables, so that its value in the model is exactly the cost paid."""
+        instance = self.instance
+        weights = dict(PREFERENCES)
+        weights.update(self.database.get_preferences())
+        weights.update(self.weights or {})
+
+        r = self.timeslots_per_day
+        days = [range(d*r, d*r + r) for d in range(6)]
+
+        def occupancy(sessions, tag):
+            # occ[T]: one of the sessions takes place at T
+            occ = {}
+            for T in self.T:
+                occ[T] = Bool(f'occ_{tag}%{T}')
+                self.solver.add(occ[T] == Or([ self.X[S,T,R] for S in sessions for R in self.rooms_at.get((S,T), []) ]))
+            return occ
+
+        def gaps(occ, tag):
+            # gap[T]: T is free, but there is a lecture before and after it in the same day
+            penalties = []
+            for slots in days:
+                before = {slots[0]: BoolVal(False)}
+                for (t, u) in zip(slots, slots[1:]):
+                    before[u] = Bool(f'before_{tag}%{u}')
+                    self.solver.add(before[u] == Or(before[t], occ[t]))
+                after = {slots[-1]: BoolVal(False)}
+                for (t, u) in zip(reversed(slots[1:]), reversed(slots[:-1])):
+                    after[u] = Bool(f'after_{tag}%{u}')
+                    self.solver.add(after[u] == Or(after[t], occ[t]))
+                for T in slots[1:-1]:
+                    gap = Bool(f'gap_{tag}%{T}')
+                    self.solver.add(gap == And(Not(occ[T]), before[T], after[T]))
+                    penalties.append((gap, 1))
+            return penalties
+
+        self.objectives = {name: [] for name in PREFERENCES}
+
+        cds_occ = {}
+        for K in self.indexes['CdS']:
+            cds_occ[K] = occupancy(instance.cds_sessions[K], f'K{K}')
+            self.objectives['gaps'] += gaps(cds_occ[K], f'K{K}')
+
+        for P in self.indexes['Professors']:
+            if len(instance.professor_sessions[P]) < 2:
+                continue
+            self.objectives['idle'] += gaps(occupancy(instance.professor_sessions[P], f'P{P}'), f'P{P}')
+
+        for (K, d) in itertools.product(self.indexes['CdS'], range(6)):
+            used = Bool(f'day_K{K}%{d}')
+            self.solver.add(used == Or([ cds_occ[K][T] for T in days[d] ]))
+            self.objectives['days'].append((used, 1))
+
+        for S in self.indexes['Sessions']:
+            (starts, rooms) = self.domains[S]
+            for R in rooms:
+                # number of sufficient rooms that are strictly smaller: rooms of the same capacity pay the same penalty
+                rank = len([Ri for Ri in rooms if instance.capacity[Ri] < instance.capacity[R]])
+                if rank == 0:
+                    continue
+                used = Bool(f'room_S{S}%{R}')
+                self.solver.add(used == Or([ self.Y[S,T,R] for T in starts ]))
+                self.objectives['rooms'].append((used, rank))
+
+        # lexicographic priority follows the order of the objectives, i.e. the heaviest preference first
+        for name in sorted(self.objectives, key=lambda name: -weights.get(name, 0)):
+            w = weights.get(name, 0)
+            if w <= 0:
+                continue
+            for (penalty, unit) in self.objectives[name]:
+                if self.priority == 'lex':
+                    self.solver.add_soft(Not(penalty), unit, id=name)
+                else:
+                    self.solver.add_soft(Not(penalty), w*unit, id='preferences')
+
+    def objective_values(self) -> Dict:
+        """Return the cost paid for every preference in the current model (unweighted)."""
+        if self.model is None:
+            raise Exception("NO MODEL TO EVALUATE THE PREFERENCES ON (A CACHED RESULT CARRIES THEM IN ITS OBJECTIVES)")
+        return {
+            name: sum(unit for (penalty, unit) in penalties if is_true(self.model.eval(penalty, model_completion=True)))
+            for (name, penalties) in self.objectives.items()
+        }
+
+    def extract_schedule(self):
+        """Read the current model and return the occupied (session, timeslot, room) triples. With the boolean engine only
+        the Y variables set to true are read: the starts of every session are evaluated until the true one (C6 allows only
+        one) and expanded over the hours of the session. After an answer of the result cache there is no model: the cached
+        rows (the ones written to SCHEDULE) are returned instead."""
+        if self.model is None:
+            if self.cached_rows is None:
+                raise Exception("NO MODEL TO READ THE SCHEDULE FROM")
+            return list(self.cached_rows)
+        rows = []
+        if self.engine == 'integer':
+            for S in self.indexes['Sessions']:
+                T = self.model.eval(self.Start[S]).as_long()
+                R = self.model.eval(self.Room[S]).as_long()
+                rows.extend((S, T+k, R) for k in range(self.instance.hours[S]))
+            return rows
+
+        for (S, triples) in self.starts.items():
+            for (_, T, R) in triples:
+                if is_true(self.model.eval(self.Y[S,T,R])):
+                    rows.extend((S, T+k, R) for k in range(self.instance.hours[S]))
+                    break
+        return rows
+
+    def enumerate_solutions(self, limit = None, min_distance = 1, timeout = None, rlimit = None):
+        """Yield distinct timetables, one at a time. After every timetable a blocking clause over its assignments is added
+        to the solver, which keeps its state (and learned clauses) between two timetables; the clauses are posted inside
+        a push/pop scope and removed when the generator is exhausted or closed. What-if edits registered while the
+        generator is suspended are posted again after the scope is popped, so they outlive the enumeration. Nothing is
+        written to SCHEDULE: pass the rows to .save() to store one of the timetables.
+        With symmetry breaking on, timetables that only differ by swapping interchangeable sessions or rooms are not
+        enumerated.
+        Input:
+            limit (int): maximum number of timetables, None to enumerate all of them
+            min_distance (int): minimum number of sessions whose (start, room) differs from every previous timetable
+            timeout (int), rlimit (int): budgets of every check, as in .solve()
+        Output: generator of lists of (session, timeslot, room) triples, as returned by .extract_schedule()"""
+        if not self.check() or not self.posed or self.violations:
+            return
+
+        with self.budget(timeout, rlimit):
+            edits = len(self.edits)
+            self.solver.push()
+            try:
+                n = 0
+                while limit is None or n < limit:
+                    with self.metrics.phase('enumerate'):
+                        c = self.solver.check(*self.assumptions())
+                    if c != sat:
+                        if c == unknown:
+                            self.emit('unknown', f"NO ANSWER FROM THE SOLVER ({self.solver.reason_unknown()})", reason=self.solver.reason_unknown())
+                        break
+
+                    self.model = self.solver.model()
+                    rows = self.extract_schedule()
+                    starts = {}
+                    for (S, T, R) in rows:
+                        if S not in starts or T < starts[S][0]:
+                            starts[S] = (T, R)
+                    if self.engine == 'integer':
+                        chosen = [And(self.Start[S] == T, self.Room[S] == R) for (S, (T, R)) in starts.items()]
+                    else:
+                        chosen = [self.Y[S,T,R] for (S, (T, R)) in starts.items()]
+
+                    n += 1
+                    self.emit('solution', None, index=n)
+                    yield rows
+
+                    self.solver.add(AtLeast(*[Not(a) for a in chosen], min_distance))
+            finally:
+                self.solver.pop()
+                # the edits registered inside the scope were popped with it
+                for e in list(self.edits.values())[edits:]:
+                    self.solver.add(*e['posted'])
 
     def end(self):
         """Close the database connection."""
@@ -170,71 +917,856 @@ class TimetableScheduler():
          
         self.database.end()
 
-    def solve(self):
-        """Run the solver and store the resulting schedule in the database if a solution is found."""
+    def solve(self, timeout = None, rlimit = None):
+        """Run the solver and store the resulting schedule in the database if a solution is found.
+        Input:
+            timeout (int), rlimit (int): budgets for this call, overriding the ones given to the constructor (see .budget())
+        Output: SolveResult. If an optimization objective is in use (the solver is an Optimize) and the budget runs out,
+        the best schedule found so far is saved and the result is flagged with best_so_far."""
         if not self.check or not self.posed:
             return -1
-        
-        c = self.solver.check()
-        if c == sat:
-            print("TIME TABLE SUCCESSFULLY CREATED")
-            self.model = self.solver.model()
+        if self.violations:
+            return self.infeasible()
 
-            print("Saving the schedule in the SQL Database...")
-            
-            self.database.create_schedule()
+        with self.budget(timeout, rlimit):
+            key = self.result_key() if self.cache_results and not self.track else None
+            if key is not None:
+                cached = load_result(key)
+                if cached is not None:
+                    return self.solve_cached(cached)
+            self.cached_rows = None
 
-            for t in self.T:
-                for (S, A) in itertools.product(self.indexes['Sessions'], self.indexes['Rooms']):
-                    val = self.model[self.X[S,t,A]]
-                    if val:
-                        self.database.insert_entry(S,t,A)
+            t0 = time.perf_counter()
+            with self.metrics.phase('check'):
+                c = self.solver.check(*self.assumptions())
+            result = SolveResult(str(c), time.perf_counter() - t0, self.statistics())
 
-            print("Schedule saved")
+            if c == sat:
+                self.emit('sat', "TIME TABLE SUCCESSFULLY CREATED", elapsed=result.elapsed)
+                self.model = self.solver.model()
 
-    def print_schedule_df(self):
-        """Return the generated schedule as a pandas DataFrame."""
+                with self.metrics.phase('extract'):
+                    rows = self.extract_schedule()
+                self.save(rows)
+
+                if self.optimize:
+                    result.objectives = self.objective_values()
+                    self.emit('objectives', f"Preferences: {result.objectives}", objectives=result.objectives)
+
+                if key is not None:
+                    store_result(key, {'status': result.status, 'rows': rows, 'objectives': result.objectives})
+
+            elif c == unsat:
+                self.emit('unsat', "NO TIME TABLE EXISTS", elapsed=result.elapsed)
+                if key is not None:
+                    store_result(key, {'status': result.status, 'rows': None, 'objectives': {}})
+                if self.track:
+                    self.core = self.diagnose()
+                else:
+                    self.emit('hint', "Call the .diagnose() method to see which constraints are in conflict.")
+
+            else:
+                result.reason = self.solver.reason_unknown()
+                self.emit('unknown', f"NO ANSWER FROM THE SOLVER ({result.reason})", elapsed=result.elapsed, reason=result.reason)
+
+                if isinstance(self.solver, Optimize):
+                    try:
+                        self.model = self.solver.model()
+                    except Z3Exception:
+                        self.model = None
+
+                    if self.model is not None and len(self.model) > 0:
+                        with self.metrics.phase('extract'):
+                            rows = self.extract_schedule()
+                        self.save(rows, "Saving the best schedule found so far in the SQL Database...")
+                        result.best_so_far = True
+                        result.objectives = self.objective_values()
+                        self.emit('objectives', f"Preferences: {result.objectives}", objectives=result.objectives)
 
-        raw_schedule = self.database.get_schedule()
-        ptr_raw = 0
+        self.report_metrics(result)
+        return result
 
-        if raw_schedule == []:
+    def solve_cached(self, cached):
+        """Answer .solve() from an entry of the result cache, writing its schedule to SCHEDULE."""
+        self.model = None
+        self.cached_rows = [tuple(row) for row in cached['rows']] if cached['status'] == 'sat' else None
+        result = SolveResult(cached['status'], 0, objectives=cached['objectives'], cached=True)
+        if result.status == 'sat':
+            self.emit('sat', "TIME TABLE SUCCESSFULLY CREATED (cached)", elapsed=0, cached=True)
+            self.save(self.cached_rows)
+            if result.objectives:
+                self.emit('objectives', f"Preferences: {result.objectives}", objectives=result.objectives)
+        else:
+            self.emit('unsat', "NO TIME TABLE EXISTS (cached)", elapsed=0, cached=True)
+        self.report_metrics(result)
+        return result
+
+    def repair(self, minimal = True, timeout = None, rlimit = None):
+        """Recompute the timetable after the data (or the constraints) changed, starting from the schedule currently stored in
+        the SCHEDULE table. The previous (session, start, room) assignments are given to the solver as phase hints (warm
+        start) and, if minimal is True, as soft constraints of an Optimize solver built from the same assertions, so that
+        the new timetable changes as few assignments as possible. In optimization mode the soft constraints are added in a
+        scope of the solver itself, to keep the preferences: the changes are then minimized after them.
+        Input:
+            minimal (bool): minimize the number of changed assignments (otherwise only warm-start the solver)
+            timeout (int), rlimit (int): budgets, as in .solve()
+        Output: SolveResult; objectives['changes'] is the number of sessions whose start or room changed (including the
+        sessions whose previous assignment is no longer feasible, and the new ones)"""
+        if not self.check() or not self.posed:
+            return -1
+
+        previous = {}
+        for (T, S, R) in self.database.get_schedule_entries():
+            if S not in previous:
+                previous[S] = (T, R)
+
+        if self.engine == 'integer':
+            kept = [ And(self.Start[S] == T, self.Room[S] == R) for (S, (T, R)) in previous.items() if S in self.Start ]
+            hints = [ (self.Start[S], T) for (S, (T, R)) in previous.items() if S in self.Start ] + \
+                    [ (self.Room[S], R) for (S, (T, R)) in previous.items() if S in self.Room ]
+            lost = 0
+        else:
+            kept = [ self.Y[S,T,R] for (S, (T, R)) in previous.items() if (S,T,R) in self.Y ]
+            hints = [ (y, True) for y in kept ]
+            # sessions whose previous assignment has no variable any more (e.g. its room is now unavailable or too small)
+            lost = len([ S for (S, (T, R)) in previous.items() if S in self.instance.hours and (S,T,R) not in self.Y ])
+
+        scoped = minimal and self.optimize
+        if scoped:
+            solver = self.solver
+            solver.push()
+            for k in kept:
+                solver.add_soft(k, 1, id='repair')
+        elif minimal:
+            solver = Optimize()
+            solver.add(self.solver.assertions())
+            for k in kept:
+                solver.add_soft(k, 1, id='repair')
+        else:
+            solver = self.solver
+
+        if hasattr(solver, 'set_initial_value'):
+            for (v, value) in hints:
+                solver.set_initial_value(v, value)
+
+        # the previous timetable need not be the representative chosen by the symmetry breaking; the soft constraints are
+        # not part of the result key, so the result cache is not used either
+        (original, symmetry_breaking, cache_results) = (self.solver, self.symmetry_breaking, self.cache_results)
+        self.solver, self.symmetry_breaking, self.cache_results = solver, False, False
+        try:
+            result = self.solve(timeout, rlimit)
+        finally:
+            self.solver, self.symmetry_breaking, self.cache_results = original, symmetry_breaking, cache_results
+            if scoped:
+                solver.pop()
+
+        if result.status == 'sat' or result.best_so_far:
+            result.objectives['changes'] = sum(1 for k in kept if not is_true(self.model.eval(k, model_completion=True))) + \
+                                           len([S for S in self.indexes['Sessions'] if S not in previous]) + lost
+            self.emit('changes', f"Changed assignments: {result.objectives['changes']}", changes=result.objectives['changes'])
+        return result
+
+    def set_budget(self, timeout = None, rlimit = None):
+        """Bound the next checks of the solver by a wall-clock timeout (milliseconds) and/or a resource limit, until changed.
+        The budget is recorded, so that .budget() restores it after a call with a budget of its own (Z3 cannot read the
+        parameters of a solver back, so one set directly on .solver is only kept by the calls without a budget)."""
+        for (name, value) in [('timeout', timeout), ('rlimit', rlimit)]:
+            if value is not None:
+                self.solver.set(name, value)
+                self.limits[name] = value
+
+    @contextmanager
+    def budget(self, timeout = None, rlimit = None):
+        """Bound the checks of the enclosed block by the budget of a call, or by the constructor's where the call gives
+        none, and restore the previous budget afterwards, so that the budget of a call does not outlive it. A parameter
+        without a budget is not touched: a timeout set directly on .solver (e.g. .solver.set("timeout", 3000)) still
+        applies. The previous value of a parameter is the one set by .set_budget(), Z3's default if there is none."""
+        budget = {'timeout': timeout if timeout is not None else self.timeout,
+                  'rlimit': rlimit if rlimit is not None else self.rlimit}
+        previous = {k: self.limits.get(k) for (k, v) in budget.items() if v is not None}
+        self.set_budget(**budget)
+        try:
+            yield
+        finally:
+            for (name, value) in previous.items():
+                self.solver.set(name, value if value is not None else NO_BUDGET[name])
+                if value is not None:
+                    self.limits[name] = value
+                else:
+                    self.limits.pop(name, None)
+
+    def statistics(self) -> Dict:
+        """Return the statistics of the last check of the solver as a dictionary."""
+        st = self.solver.statistics()
+        return {k: st.get_key_value(k) for k in st.keys()}
+
+    def assumptions(self):
+        """Return the literals assumed at every check: the C6 guard of the sessions not removed (incremental mode), the
+        literals of the applied what-if edits and the negated literals of the undone edits that guard something while
+        undone (see .add_session()). The symmetry breaking literal is assumed only while no edit is applied."""
+        applied = [e for e in self.edits.values() if e['applied']]
+        removed = {e['removes'] for e in applied}
+        undone = [Not(e['literal']) for e in self.edits.values() if not e['applied'] and e['guarded']]
+        symmetry = [self.symmetry] if self.symmetry_breaking and self.engine == 'boolean' and not applied else []
+        return [a for (S, a) in self.active.items() if S not in removed] + [e['literal'] for e in applied] + undone + symmetry
+
+    def edit(self, description, constraint, removes = None):
+        """Register a what-if edit: the constraint is added to the solver guarded by a fresh literal, which is assumed at
+        every check while the edit is applied. Undoing the edit just stops assuming the literal, so the solver keeps its
+        state (and learned clauses) across edits.
+        Input:
+            description (str): shown by .diagnose() when the edit is part of the unsat core
+            constraint (BoolRef): what the edit enforces
+            removes (int): ID of the session whose C6 guard must no longer be assumed
+        Output: ID of the edit (int)"""
+        if not self.check() or not self.posed:
+            return -1
+        if self.engine != 'boolean':
+            raise Exception("WHAT-IF EDITS ARE ONLY AVAILABLE WITH THE BOOLEAN ENGINE")
+
+        n = len(self.edits)
+        literal = Bool(f'EDIT-n={n}')
+        self.edits[n] = {'description': description, 'literal': literal, 'applied': True, 'removes': removes, 'posted': [],
+                         'guarded': False}
+        self.post_edit(n, Implies(literal, constraint))
+        return n
+
+    def post_edit(self, n, formula):
+        """Add a formula of the what-if edit with ID n to the solver, recording it with the edit (see
+        .enumerate_solutions(), which posts it again if it was added inside its push/pop scope)."""
+        self.solver.add(formula)
+        self.edits[n]['posted'].append(formula)
+
+    def undo(self, n):
+        """Stop applying the what-if edit with ID n."""
+        self.edits[n]['applied'] = False
+
+    def redo(self, n):
+        """Apply again the what-if edit with ID n."""
+        self.edits[n]['applied'] = True
+
+    def undo_all(self):
+        """Stop applying every what-if edit."""
+        for e in self.edits.values():
+            e['applied'] = False
+
+    def block_room(self, R, timeslots = None):
+        """What-if edit: room R is unavailable in the given timeslots (all of them by default)."""
+        timeslots = self.T if timeslots is None else timeslots
+        return self.edit(
+            f"room {R} unavailable in {len(timeslots)} timeslot(s)",
+            And([ Not(self.X[S,T,R]) for T in timeslots for S in self.sessions_at.get((T,R), []) ])
+        )
+
+    def block_timeslot(self, T):
+        """What-if edit: no session can take place in timeslot T."""
+        return self.edit(
+            f"timeslot {T} unavailable",
+            And([ Not(self.X[S,T,R]) for R in self.indexes['Rooms'] for S in self.sessions_at.get((T,R), []) ])
+        )
+
+    def block_day(self, d):
+        """What-if edit: no session can take place in the day d (0 for Monday), e.g. a holiday."""
+        timeslots = range(d*self.timeslots_per_day, (d+1)*self.timeslots_per_day)
+        return self.edit(
+            f"{self.days[d]} unavailable",
+            And([ Not(self.X[S,T,R]) for T in timeslots for R in self.indexes['Rooms'] for S in self.sessions_at.get((T,R), []) ])
+        )
+
+    def block_professor(self, P, timeslots):
+        """What-if edit: professor P is unavailable in the given timeslots (e.g. range(d*r, d*r + r) for the day d)."""
+        return self.edit(
+            f"prof. {P} unavailable in {len(timeslots)} timeslot(s)",
+            And([ Not(self.X[S,T,R]) for S in self.instance.professor_sessions.get(P, []) for T in timeslots for R in self.rooms_at.get((S,T), []) ])
+        )
+
+    def pin(self, S, T, R):
+        """What-if edit: session S starts at timeslot T in room R."""
+        return self.edit(f"session {S} pinned at timeslot {T} in room {R}", self.Y[S,T,R])
+
+    def remove_session(self, S):
+        """What-if edit: session S is not scheduled. Requires incremental=True for the sessions of the database."""
+        if S not in self.active:
+            raise Exception("REMOVING A SESSION REQUIRES incremental=True")
+        return self.edit(f"session {S} removed", Not(self.active[S]), removes=S)
+
+    def add_session(self, S, course, hours):
+        """What-if edit: a new session S of an existing course, lasting the given hours. Its constraints are posted pairwise
+        against the existing sessions, guarded by the edit. The session is not written to the Session table, so it is
+        only visible in the SCHEDULE table."""
+        if not self.check() or not self.posed:
+            return -1
+        # every check that can fail comes before the instance and the variables are changed
+        if self.engine != 'boolean':
+            raise Exception("WHAT-IF EDITS ARE ONLY AVAILABLE WITH THE BOOLEAN ENGINE")
+        if S in self.instance.hours:
+            raise Exception("SESSION ALREADY EXISTS")
+        if course not in self.instance.courses:
+            raise Exception("COURSE DOES NOT EXIST")
+
+        self.include_session(S, course, hours)
+
+        n = self.edit(f"session {S} added ({hours}h of course {course})", And(self.session_constraints(S)))
+        # while the edit is not applied the session must not show up in the schedule
+        self.edits[n]['guarded'] = True
+        self.post_edit(n, Implies(Not(self.edits[n]['literal']), And([ Not(y) for ((Si, T, R), y) in self.Y.items() if Si == S ])))
+        return n
+
+    def include_session(self, S, course, hours):
+        """Add a session that is not in the database to the instance and create its variables, without posting any
+        constraint (see .add_session())."""
+        self.instance = self.instance.with_session(S, hours, course)
+        self.indexes = self.instance.ids()
+        self.added[S] = (course, hours)
+        self.prune([S])
+        self.create_variables(S)
+
+    def session_constraints(self, S):
+        """Return the constraints binding session S to the other sessions (pairwise encoding) and its own C2, C6, C7."""
+        instance = self.instance
+        r = self.timeslots_per_day
+        constraints = []
+        own = [(key, x) for (key, x) in self.X.items() if key[0] == S]
+        ys = [(key, y) for (key, y) in self.Y.items() if key[0] == S]
+
+        for ((_, T, R), x) in own:
+            # C1, C7
+            others = [ Not(self.X[Si, T, R]) for Si in self.sessions_at[T,R] if Si != S ] + \
+                     [ Not(self.X[S, T, Ri]) for Ri in self.rooms_at[S,T] if Ri != R ]
+            # C3, C4
+            others += [ Not(self.X[Si, T, Ri]) for Si in set(instance.professor_sessions[instance.professor[S]]) | instance.conflicts[S]
+                        if Si != S for Ri in self.rooms_at.get((Si,T), []) ]
+            constraints.append(Implies(x, And(others)))
+            # C2 (converse)
+            day_start = (T // r) * r
+            constraints.append(Implies(x, Or([ self.Y[S,t,R] for t in range(max(day_start, T-instance.hours[S]+1), T+1) if (S,t,R) in self.Y ])))
+
+        # C2
+        for ((_, T, R), y) in ys:
+            constraints.append(Implies(y, And([ self.X[S,T+k,R] for k in range(instance.hours[S]) ])))
+
+        # C6
+        if not ys:
+            return [BoolVal(False)]
+        constraints.append(AtMost(*[y for (_, y) in ys], 1))
+        if self.incremental:
+            constraints.append(Implies(self.active[S], AtLeast(*[y for (_, y) in ys], 1)))
+            constraints.append(Implies(Not(self.active[S]), Not(Or([y for (_, y) in ys]))))
+        else:
+            constraints.append(AtLeast(*[y for (_, y) in ys], 1))
+
+        # OPTIONAL: not on the same day as another session of the course
+        if self.optional_constraints:
+            for Si in instance.course_sessions[instance.session_course[S]]:
+                if Si == S:
+                    continue
+                for d in range(6):
+                    mine = [y for ((_, T, R), y) in ys if T // r == d]
+                    theirs = [y for ((Sj, T, R), y) in self.Y.items() if Sj == Si and T // r == d]
+                    if mine and theirs:
+                        constraints.append(Implies(Or(mine), Not(Or(theirs))))
+
+        return constraints
+
+    def custom_constraints(self):
+        """Return the assertions added to the solver by hand, i.e. not by .add_constraints()."""
+        (first, last) = self.posted
+        return [a for (i, a) in enumerate(self.solver.assertions()) if not (first <= i < last)]
+
+    def solve_portfolio(self, configurations = None, processes = None, timeout = None, rlimit = None):
+        """Race several differently configured solvers in a process pool and store the first timetable found.
+        Every worker rebuilds the model from the database with its own configuration (see PORTFOLIO); the custom
+        constraints added to .solver and the applied what-if edits are passed along in SMT-LIB2 format, in which case only
+        the configurations using the same engine are run. As soon as one worker answers sat (or unsat, which holds for all of them) the pool is
+        terminated. The workers are built with the same options as the scheduler; in optimization mode only the
+        configurations of the boolean engine that keep the Optimize solver (no 'logic') are run.
+        Input:
+            configurations (List[Dict]): configurations to race, defaults to PORTFOLIO
+            processes (int): size of the pool, defaults to the number of configurations (at most the number of CPUs)
+            timeout (int), rlimit (int): budgets of every worker, as in .solve()
+        Output: SolveResult, whose configuration is the winning one (None if no worker could decide the problem)"""
+        if not self.check() or not self.posed:
+            return -1
+        if self.violations:
+            return self.infeasible()
+
+        configurations = PORTFOLIO if configurations is None else configurations
+        if self.optimize:
+            configurations = [c for c in configurations if c.get('engine', self.engine) == 'boolean' and 'logic' not in c]
+
+        # the edits not applied are switched off, their literals would be free otherwise
+        custom = self.custom_constraints() + self.assumptions() + [Not(e['literal']) for e in self.edits.values() if not e['applied']]
+        if custom:
+            configurations = [c for c in configurations if c.get('engine', self.engine) == self.engine]
+            buffer = Solver()
+            buffer.add(custom)
+            custom = buffer.to_smt2()
+        else:
+            custom = None
+
+        budget = (timeout if timeout is not None else self.timeout, rlimit if rlimit is not None else self.rlimit)
+        if not configurations:
+            raise Exception("NO CONFIGURATION OF THE PORTFOLIO FITS THE SCHEDULER")
+        tasks = [(i, self.fname, self.timeslots_per_day, self.t_start, self.options, c, custom, budget, self.added)
+                 for (i, c) in enumerate(configurations)]
+        processes = processes or min(len(tasks), os.cpu_count() or 1)
+
+        t0 = time.perf_counter()
+        result = SolveResult('unknown', 0)
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            for (i, answer, rows, statistics, objectives) in pool.imap_unordered(portfolio_worker, tasks):
+                if answer == 'sat':
+                    result = SolveResult(answer, 0, statistics, configuration=configurations[i], objectives=objectives)
+                    self.emit('sat', f"TIME TABLE SUCCESSFULLY CREATED (configuration {configurations[i]})", configuration=configurations[i])
+                    self.save(rows)
+                    break
+                if answer == 'unsat':
+                    result = SolveResult(answer, 0, statistics, configuration=configurations[i])
+                    self.emit('unsat', "NO TIME TABLE EXISTS", configuration=configurations[i])
+                    break
+            pool.terminate()
+
+        if result.status == 'unknown':
+            self.emit('unknown', "NO ANSWER FROM THE SOLVERS")
+        result.elapsed = time.perf_counter() - t0
+        self.metrics.phases['portfolio'] = self.metrics.phases.get('portfolio', 0) + result.elapsed
+        self.report_metrics(result)
+        return result
+
+    def solve_decomposed(self, processes = None, timeout = None, rlimit = None):
+        """Split the instance into independent or weakly coupled parts (see decomposition.decompose), solve each part as
+        its own Z3 problem in a process pool and merge the results into one SCHEDULE table. Parts obtained by splitting the
+        rooms of weakly coupled components may turn out unsatisfiable; their group is then solved again as a whole.
+        Custom constraints and what-if edits cannot be split: if there are any, this falls back to .solve().
+        Input:
+            processes (int): size of the pool, defaults to the number of CPUs
+            timeout (int), rlimit (int): budgets of every part, as in .solve()
+        Output: SolveResult"""
+        if not self.check() or not self.posed:
+            return -1
+        if self.violations:
+            return self.infeasible()
+
+        if self.custom_constraints() or self.edits:
+            self.emit('fallback', "Custom constraints or what-if edits found: solving the instance as a whole.")
+            return self.solve(timeout, rlimit)
+
+        groups = decompose(self.instance, self.domains, len(self.T))
+        self.emit('decomposition', f"Instance split into {len(groups)} independent group(s) and {sum(len(parts) for (_, _, parts) in groups)} part(s)",
+                  groups=[len(sessions) for (sessions, _, _) in groups], parts=sum(len(parts) for (_, _, parts) in groups))
+
+        budget = (timeout if timeout is not None else self.timeout, rlimit if rlimit is not None else self.rlimit)
+        flags = dict(self.options)
+
+        t0 = time.perf_counter()
+        rows = {g: [] for g in range(len(groups))}
+        answers = {}
+        with multiprocessing.get_context('spawn').Pool(processes or os.cpu_count() or 1) as pool:
+            tasks = [(g, (self.fname, self.timeslots_per_day, self.t_start, flags, sessions, rooms, budget))
+                     for (g, (_, _, parts)) in enumerate(groups) for (sessions, rooms) in parts]
+            for ((g, _), (answer, part_rows)) in zip(tasks, pool.map(decomposition_worker, [t for (_, t) in tasks])):
+                if answer == 'sat':
+                    rows[g].extend(part_rows)
+                elif answers.get(g) != 'unsat':
+                    answers[g] = answer
+
+            # a split group that failed is solved again with all its rooms
+            retry = [g for g in answers if len(groups[g][2]) > 1]
+            tasks = [(g, (self.fname, self.timeslots_per_day, self.t_start, flags, groups[g][0], groups[g][1], budget)) for g in retry]
+            for ((g, _), (answer, group_rows)) in zip(tasks, pool.map(decomposition_worker, [t for (_, t) in tasks])):
+                rows[g] = group_rows or []
+                if answer == 'sat':
+                    del answers[g]
+                else:
+                    answers[g] = answer
+
+        status = 'unsat' if 'unsat' in answers.values() else ('unknown' if answers else 'sat')
+        result = SolveResult(status, time.perf_counter() - t0)
+
+        if status == 'sat':
+            self.emit('sat', "TIME TABLE SUCCESSFULLY CREATED", elapsed=result.elapsed)
+            self.save([row for g in rows for row in rows[g]])
+        elif status == 'unsat':
+            self.emit('unsat', "NO TIME TABLE EXISTS", elapsed=result.elapsed)
+        else:
+            self.emit('unknown', "NO ANSWER FROM THE SOLVER", elapsed=result.elapsed)
+
+        self.metrics.phases['decomposed'] = self.metrics.phases.get('decomposed', 0) + result.elapsed
+        self.report_metrics(result)
+        return result
+
+    def compile_cnf(self):
+        """Compile the Boolean model (assertions and assumed literals) to CNF, see dimacs.compile_cnf.
+        Output: Goal of clauses"""
+        if self.engine != 'boolean' or self.optimize:
+            raise Exception("THE SAT BACKEND NEEDS THE BOOLEAN ENGINE WITHOUT OPTIMIZATION")
+        with self.metrics.phase('cnf'):
+            goal = compile_cnf(list(self.solver.assertions()) + self.assumptions())
+        return goal
+
+    def export_dimacs(self, path):
+        """Write the model in DIMACS, to be solved by any SAT solver. The comments of the file ('c <variable> <name>') name
+        the variables of the model: Y_S%T%R is true if session S takes room R in timeslot T.
+        Input: path (str): destination file
+        Output: DIMACS variable -> name of the Z3 variable"""
+        if not self.check() or not self.posed:
+            return -1
+        return write_dimacs(self.compile_cnf(), path)
+
+    def solve_sat(self, command = None, path = None, timeout = None):
+        """Solve the Boolean model as a pure SAT problem: the model is compiled to CNF (see .export_dimacs()) and solved by
+        Z3's SAT solver or by an external one, whose assignment is mapped back to the variables of the model. The
+        schedule is stored in the database as in .solve(). Not available with the integer engine nor with optimization.
+        Input:
+            command (List[str]): external SAT solver and its options, e.g. ['kissat', '-q'] (the DIMACS file is appended);
+                None for Z3's SAT solver
+            path (str): where to write the DIMACS file, None for a temporary file
+            timeout (int): budget in milliseconds, overriding the one given to the constructor
+        Output: SolveResult"""
+        if not self.check() or not self.posed:
+            return -1
+        if self.violations:
+            return self.infeasible()
+        timeout = timeout if timeout is not None else self.timeout
+
+        goal = self.compile_cnf()
+        self.emit('cnf', f"CNF: {len(goal)} clauses", clauses=len(goal))
+
+        t0 = time.perf_counter()
+        (self.model, self.cached_rows, statistics, reason) = (None, None, {}, None)
+        if goal.inconsistent():
+            answer = 'unsat'
+        else:
+            temporary = path is None
+            if temporary:
+                (fd, path) = tempfile.mkstemp(suffix='.cnf')
+                os.close(fd)
+            try:
+                names = write_dimacs(goal, path)
+                with self.metrics.phase('check'):
+                    if command is None:
+                        (answer, assignment, statistics, reason) = solve_cnf(path, timeout)
+                    else:
+                        (answer, assignment) = run_solver(command, path, timeout)
+                        reason = f"no answer from {command[0]}"
+            finally:
+                if temporary:
+                    os.remove(path)
+            if answer == 'sat':
+                with self.metrics.phase('extract'):
+                    self.model = to_model(goal, {names[v]: value for (v, value) in assignment.items() if v in names})
+        result = SolveResult(answer, time.perf_counter() - t0, statistics, configuration={'backend': command[0] if command else 'z3'})
+
+        if answer == 'sat':
+            self.emit('sat', "TIME TABLE SUCCESSFULLY CREATED", elapsed=result.elapsed)
+            with self.metrics.phase('extract'):
+                rows = self.extract_schedule()
+            self.save(rows)
+        elif answer == 'unsat':
+            self.emit('unsat', "NO TIME TABLE EXISTS", elapsed=result.elapsed)
+            self.emit('hint', "Call the .diagnose() method to see which constraints are in conflict.")
+        else:
+            result.reason = reason
+            self.emit('unknown', f"NO ANSWER FROM THE SOLVER ({result.reason})", elapsed=result.elapsed, reason=result.reason)
+
+        self.report_metrics(result)
+        return result
+
+    def term_exception(self, exception):
+        """Return the ID of the what-if edit applying an exception of a week (see TERM_EXCEPTIONS), registering it the first
+        time: weeks with the same exception share its edit."""
+        key = tuple(tuple(a) if isinstance(a, (list, range)) else a for a in exception)
+        if key not in self.term_edits:
+            if exception[0] not in TERM_EXCEPTIONS:
+                raise Exception("UNKNOWN EXCEPTION")
+            self.term_edits[key] = getattr(self, TERM_EXCEPTIONS[exception[0]])(*exception[1:])
+        return self.term_edits[key]
+
+    def solve_term(self, weeks, exceptions = None, timeout = None, rlimit = None):
+        """Schedule a term of several weeks from a weekly template. The template is solved once by .solve() and repeated
+        in every week; only the weeks with exceptions (holidays, room closures, ...) are solved again, on the same solver:
+        their exceptions are applied as what-if edits and the sessions of the template are assumed in place, except those
+        in the unsat core of the week, which are let free to move until the week is satisfiable. A deviating week thus
+        keeps most of the template and costs a few incremental checks, instead of a model N times larger.
+        The timetable of every week is stored in the TERM_SCHEDULE table, the template in SCHEDULE.
+        Input:
+            weeks (int): number of weeks of the term
+            exceptions (Dict[int, List[Tuple]]): week (from 1) -> exceptions of the week, see TERM_EXCEPTIONS
+            timeout (int), rlimit (int): budgets of every check, as in .solve()
+        Output: SolveResult of the template, whose weeks field gives the status of every week and the number of sessions
+        moved from the template; the status is 'unsat' (or 'unknown') if a week could not be scheduled"""
+        if not self.check() or not self.posed:
+            return -1
+        if self.engine != 'boolean':
+            raise Exception("TERM MODE IS ONLY AVAILABLE WITH THE BOOLEAN ENGINE")
+        exceptions = exceptions or {}
+
+        result = self.solve(timeout, rlimit)
+        if not isinstance(result, SolveResult) or result.status != 'sat':
+            return result
+
+        template = {}
+        for (T, S, R) in self.database.get_schedule_entries():
+            if S not in template:
+                template[S] = (T, R)
+        rows = [(S, T+k, R) for (S, (T, R)) in template.items() for k in range(self.instance.hours[S])]
+
+        with self.budget(timeout, rlimit):
+            applied = {n for (n, e) in self.edits.items() if e['applied']}
+            term = []
+            t0 = time.perf_counter()
+            for w in range(1, weeks+1):
+                if not exceptions.get(w):
+                    result.weeks[w] = {'status': 'sat', 'changes': 0}
+                    term.extend((w, S, T, R) for (S, T, R) in rows)
+                    continue
+
+                edits = [self.term_exception(e) for e in exceptions[w]]
+                for n in edits:
+                    self.redo(n)
+                removed = {self.edits[n]['removes'] for n in edits}
+                pins = {self.Y[S,T,R].get_id(): (S, self.Y[S,T,R]) for (S, (T, R)) in template.items() if S not in removed}
+
+                # free the pinned sessions of the unsat core until the week is satisfiable (or no pin is left in the core)
+                with self.metrics.phase('term'):
+                    while True:
+                        c = self.solver.check(*self.assumptions(), *[y for (_, y) in pins.values()])
+                        if c != unsat:
+                            break
+                        core = [pins[a.get_id()] for a in self.solver.unsat_core() if a.get_id() in pins]
+                        if not core:
+                            break
+                        for (S, y) in core:
+                            del pins[y.get_id()]
+
+                if c == sat:
+                    self.model = self.solver.model()
+                    week = self.extract_schedule()
+                    changes = sum(1 for (S, (T, R)) in template.items() if S not in removed and not is_true(self.model.eval(self.Y[S,T,R])))
+                    term.extend((w, S, T, R) for (S, T, R) in week)
+                else:
+                    changes = None
+                result.weeks[w] = {'status': str(c), 'changes': changes}
+                self.emit('week', f"Week {w}: {str(c).upper()}" + (f", {changes} session(s) moved" if c == sat else ""), week=w, status=str(c), changes=changes)
+
+                for n in edits:
+                    if n not in applied:
+                        self.undo(n)
+
+        failed = [w for (w, r) in result.weeks.items() if r['status'] != 'sat']
+        if failed:
+            result.status = 'unsat' if any(result.weeks[w]['status'] == 'unsat' for w in failed) else 'unknown'
+            self.emit('unsat', f"NO TIME TABLE EXISTS FOR THE WEEK(S) {failed}", weeks=failed)
+        result.objectives['changes'] = sum(r['changes'] or 0 for r in result.weeks.values())
+        result.elapsed += time.perf_counter() - t0
+
+        self.emit('saving', "Saving the term schedule in the SQL Database...")
+        with self.metrics.phase('save'):
+            self.database.save_term_schedule(term)
+        self.emit('saved', "Term schedule saved", rows=len(term), weeks=weeks)
+        self.report_metrics(result)
+        return result
+
+    def diagnose(self):
+        """Explain an unsat answer. In track mode the unsat core of the last check is used directly; otherwise the
+        constraints are posted again, tracked, on a fresh solver (custom constraints included, under the USER family).
+        The applied what-if edits are part of the core under the EDIT family, as are the undone edits of .add_session()
+        (marked as undone); the constraints of the added sessions come with their edits.
+        Output: dictionary mapping each constraint family (C1...C7, OPTIONAL, USER, EDIT) to the readable descriptions of
+        the constraints of the core, or None if the problem is not unsatisfiable. If the instance violates the pre-checks,
+        the violated bounds are returned instead (see .feasibility_report())."""
+        if not self.check() or not self.posed:
+            return -1
+        if self.violations:
+            return self.feasibility_report()
+
+        if self.track:
+            solver = self.solver
+        else:
+            solver = Solver()
+            solver.set("core.minimize", True)
+            for (i, assertion) in enumerate(self.custom_constraints()):
+                solver.assert_and_track(assertion, f"USER-n={i}")
+
+            # the symmetry breaking constraints are left out: they never cause an unsat answer on their own
+            (original, symmetry_breaking, metrics) = (self.solver, self.symmetry_breaking, self.metrics)
+            self.solver, self.track, self.symmetry_breaking, self.metrics = solver, True, False, Metrics()
+            try:
+                if self.engine == 'integer':
+                    self.add_integer_constraints()
+                else:
+                    self.add_boolean_constraints()
+            finally:
+                self.solver, self.track, self.symmetry_breaking, self.metrics = original, False, symmetry_breaking, metrics
+
+            if solver.check(*self.assumptions()) != unsat:
+                self.emit('diagnosis', "The problem is not unsatisfiable: nothing to diagnose.", core=None)
+                return None
+
+        names = self.database.get_names()
+        families = ['C1', 'C2', 'C3', 'C4', 'C5', 'C6', 'C7', 'AVAILABILITY', 'OPTIONAL', 'SYMMETRY', 'USER', 'EDIT']
+        report = {}
+        for label in solver.unsat_core():
+            # the literal of an undone edit of .add_session() is assumed negated
+            undone = is_not(label)
+            if undone:
+                label = label.arg(0)
+            (family, _, indexes) = label.decl().name().partition('-')
+            where = dict(item.split('=') for item in indexes.split('%')) if indexes else {}
+            if family == 'EDIT':
+                description = self.edits[int(where['n'])]['description']
+                report.setdefault(family, []).append(f"{description} (undone)" if undone else description)
+            else:
+                report.setdefault(family, []).append(self.describe(where, names))
+
+        report = {f: report[f] for f in sorted(report, key=lambda f: families.index(f) if f in families else len(families))}
+        self.emit('diagnosis', "\n".join(f"{family} ({len(constraints)}):\n" + "\n".join(f"    {c}" for c in constraints)
+                                         for (family, constraints) in report.items()), core=report)
+
+        return report
+
+    def describe(self, where, names):
+        """Turn the indexes of a tracking label into a readable string, using the names returned by SQLUtility.get_names."""
+        parts = []
+        for (k, v) in where.items():
+            if k in ['S', 'S2']:
+                parts.append(f"session {v} ({names['Courses'].get(self.instance.session_course.get(int(v)))})")
+            elif k == 'T':
+                parts.append(f"{self.days[int(v) // self.timeslots_per_day]} {self.hours[int(v) % self.timeslots_per_day]}")
+            elif k == 'R':
+                parts.append(f"room {names['Rooms'].get(int(v))}")
+            elif k == 'P':
+                parts.append(f"prof. {names['Professors'].get(int(v))}")
+            elif k == 'K':
+                parts.append(f"CdS {names['CdS'].get(int(v))}")
+            elif k == 'C':
+                parts.append(f"course {names['Courses'].get(int(v))}")
+            elif k == 'D':
+                parts.append(self.days[int(v)])
+            elif k == 'n':
+                parts.append(f"custom constraint #{v}")
+            else:
+                parts.append(f"{k}={v}")
+        return ", ".join(parts)
+
+    def schedule_frame(self) -> pd.DataFrame:
+        """Load the SCHEDULE join once (see SQLUtility.get_schedule_frame) and add the typed columns day and hour, as
+        categoricals ordered like the week. All the views and exports are derived from this frame.
+        Output: DataFrame with one row per (timeslot, session, room, CdS)"""
+        frame = self.database.get_schedule_frame()
+        if frame.empty:
             raise Exception("SCHEDULE NOT FOUND")
-        
-        processed_schedule = []
 
-        for t in self.T: 
-            t_i = []
+        frame['day'] = pd.Categorical.from_codes(frame['Timeslot'] // self.timeslots_per_day, categories=self.days, ordered=True)
+        frame['hour'] = pd.Categorical.from_codes(frame['Timeslot'] % self.timeslots_per_day, categories=self.hours, ordered=True)
+        return frame
 
-            flag = False
-            if ptr_raw >= len(raw_schedule):
-                flag = True   
+    def schedule_grid(self, frame: pd.DataFrame, by: Optional[Literal['cds', 'prof', 'course', 'room']] = None, id = None) -> pd.DataFrame:
+        """Return the hours x days grid of the schedule, or of the part of it concerning one CdS, professor, course or room.
+        Input:
+            frame (DataFrame): as returned by .schedule_frame()
+            by (str), id (int): the view, None for the whole schedule
+        Output: DataFrame whose cells list the lectures of each timeslot as 'course [room]'"""
+        if by is not None:
+            frame = frame[frame[VIEWS[by]] == id]
+        rows = frame.drop_duplicates(['Timeslot', 'Session', 'Room'])
 
-            if not flag:
-                entry = raw_schedule[ptr_raw]
-            while entry[0] == t and not flag:
-                t_i.append(f"{entry[1]} [{entry[2]}]")
-                ptr_raw += 1
-                
-                if ptr_raw >= len(raw_schedule):
-                    break 
+        cells = (rows['CourseName'] + " [" + rows['RoomName'] + "]").groupby(rows['Timeslot']).agg("\n> ".join)
+        cells = (" > " + cells.reindex(self.T, fill_value="NO LECTURES / ACTIVITIES")).to_numpy(dtype=object)
+
+        return pd.DataFrame(cells.reshape(6, self.timeslots_per_day), columns=self.hours, index=self.days).T
+
+    def schedule_views(self, frame: Optional[pd.DataFrame] = None) -> Dict:
+        """Derive all the views of the schedule in one pass over the frame: the global grid and the grid of every CdS,
+        professor, room and course with at least one lecture.
+        Input: frame (DataFrame): as returned by .schedule_frame(), loaded if not given
+        Output: dictionary mapping 'global' and every (by, id) pair to its grid (see .schedule_grid())"""
+        frame = self.schedule_frame() if frame is None else frame
+        views = {'global': self.schedule_grid(frame)}
+        for (by, column) in VIEWS.items():
+            for (id, group) in frame.groupby(column, sort=True):
+                views[by, id] = self.schedule_grid(group)
+        return views
+
+    def export_schedule(self, path: str, views = True):
+        """Export the schedule in bulk, in the format given by the extension of path:
+        - .csv and .parquet: the flat frame of .schedule_frame() (parquet needs pyarrow or fastparquet);
+        - .xlsx: one sheet with the flat frame, one with the global grid and, if views is True, one per CdS, professor,
+          room and course (like timetables/aida.xlsx).
+        Input:
+            path (str): destination file
+            views (bool): also write the per-CdS/professor/room/course sheets (xlsx only)"""
+        frame = self.schedule_frame()
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == '.csv':
+            frame.to_csv(path, index=False)
+        elif extension == '.parquet':
+            frame.to_parquet(path, index=False)
+        elif extension == '.xlsx':
+            grids = self.schedule_views(frame) if views else {'global': self.schedule_grid(frame)}
+            with pd.ExcelWriter(path) as writer:
+                frame.to_excel(writer, sheet_name='Data', index=False)
+                for (key, grid) in grids.items():
+                    sheet = 'Schedule' if key == 'global' else f"{key[0]} {key[1]}"
+                    grid.to_excel(writer, sheet_name=sheet[:31])
+        else:
+            raise Exception("UNSUPPORTED FORMAT")
+
+    def print_schedule_df(self):
+        """Return the generated schedule as a pandas DataFrame."""
+        return self.schedule_grid(self.schedule_frame())
+
+    def calendar_events(self, by: Literal['cds', 'prof', 'course', 'room'], id: int, frame: pd.DataFrame):
+        """Build in memory the events of the calendar of a CdS, professor, course or room: consecutive hours of the same
+        course in the same room and day form one event, and every course gets its own colour.
+        Input:
+            by (str), id (int): the calendar
+            frame (DataFrame): as returned by .schedule_frame()
+        Output: (list of weekplot.Event, earliest hour, latest hour, title), the hours as in weekplot.parseTxt"""
+        if by not in ['cds', 'prof', 'course', 'room']:
+            raise Exception("no")
 
-                entry = raw_schedule[ptr_raw]
+        rows = frame[frame[VIEWS[by]] == id].drop_duplicates(['Timeslot', 'Session', 'Room']).sort_values(['Timeslot', 'Course', 'Room'])
+        schedule = list(rows[['Timeslot', 'Course', 'Room']].itertuples(index=False, name=None))
 
-            if t_i == []:
-                t_i = ["NO LECTURES / ACTIVITIES"]
+        courses_name = dict(zip(frame['Course'], frame['CourseName']))
+        rooms_name = dict(zip(frame['Room'], frame['RoomName']))
 
-            processed_schedule.append(" > " + "\n> ".join(t_i))
+        # name of the calendar's entity, from the database if it has no lecture
+        column = VIEWS[by]
+        names = dict(zip(frame[column], frame[column + 'Name']))
+        if id not in names:
+            names = self.database.get_names()[{'cds': 'CdS', 'prof': 'Professors', 'course': 'Courses', 'room': 'Rooms'}[by]]
+        title = {'cds': "Course in {}", 'prof': "Prof. {}", 'course': "Lectures for {}", 'room': "Room {}"}[by].format(names[id])
 
-        np_schedule = np.array(processed_schedule, dtype=object)
-        np_schedule = np_schedule.reshape(6, self.timeslots_per_day)
+        map_courses_idx = {} # Maps a course ID to an unique index from 0 to len(COLORMAP).
+        for (T, C, A) in schedule:
+            if not (C in map_courses_idx):
+                if len(map_courses_idx) >= len(COLORMAP):
+                    raise Exception("too many colours")
+                map_courses_idx[C] = len(map_courses_idx)
 
-        df = pd.DataFrame(np_schedule, columns=self.hours, index=self.days)
+        r = self.timeslots_per_day
+        events = []
+        current = None # (course, room, timeslot) of the last hour added to an event
+        for (T, C, A) in schedule:
+            # a new event starts when the course, the room or the day changes, or after a free hour
+            if current is None or current[:2] != (C, A) or T - current[2] > 1 or T // r != current[2] // r:
+                events.append(Event(f"{courses_name[C]} [{rooms_name[A]}]", [self.days[T // r]], self.t_start + T % r, 0,
+                                    None, 0, COLORMAP[map_courses_idx[C]]))
+            events[-1].endH = self.t_start + T % r + 1
+            current = (C, A, T)
 
-        return df.T
+        earliest = min([e.startH for e in events], default=self.t_start)
+        latest = max([e.endH + 1 for e in events], default=self.t_start + r) + 1
+        return (events, earliest, latest, title)
 
-    def draw_calendar(self, name: str, by: Literal['cds', 'prof', 'course', 'room'], id: int):
-        """Generate and save a visual calendar for a specific course, professor, CdS, or room."""
+    def draw_calendar(self, name: str, by: Literal['cds', 'prof', 'course', 'room'], id: int, frame: Optional[pd.DataFrame] = None):
+        """Generate and save a visual calendar for a specific course, professor, CdS, or room.
+        The schedule is taken from frame (see .schedule_frame()), which is loaded if not given: pass it when drawing many
+        calendars, so that the database is read only once. The events are also written to ./timetables/ as text, in the
+        format read by weekplot.parseTxt; see .draw_calendars() to render many calendars to image files at once."""
         
         if by not in ['cds', 'prof', 'course', 'room']:
             raise Exception("no")
@@ -247,92 +1779,50 @@ class TimetableScheduler():
         # - By Course (view sessions)
         # - By room (view the occupancy of each room)
 
-        schedule = self.database.get_schedule_subset(by, id)
-        
-        map_start = {} # T -> Starting hour
-        map_end = {}  # T -> Ending hour
-        map_courses_idx = {} # Maps a course ID to an unique index from 0 to len(colormap).
+        frame = self.schedule_frame() if frame is None else frame
+        (events, earliest, latest, title) = self.calendar_events(by, id, frame)
 
-        names = self.database.get_names()
+        with open(f"./timetables/{name}_{by}_{id}.txt", 'w') as f:
+            for e in events:
+                f.write(f"{e.name}\n")
+                f.write(f"{e.days[0][:3]}\n")
+                f.write(f"{str(e.startH).zfill(2)}:00 - {str(e.endH).zfill(2)}:00\n")
+                f.write(f"{e.color}\n")
+                f.write("\n")
 
-        courses_name = names['Courses']
-        rooms_name = names['Rooms']
-        cds_name = names['CdS']
-        prof_name = names['Professors']
-
-        colormap = [
-            'gray', 'sienna', 'lightgoldenrodyellow', 'mediumspringgreen', 'deepskyblue', 'darkorchid',
-            'silver', 'sandybrown', 'olivedrab', 'lightseagreen', 'aliceblue', 'plum',
-            'rosybrown', 'bisque', 'olivedrab', 'lightseagreen', 'slategray', 'mediumvioletred',
-            'firebrick', 'moccasin', 'chartreuse', 'paleturquoise', 'royalblue', 'palevioletred',
-            'red', 'gold', 'palegreen', 'paleturquoise', 'navy', 
-            'darksalmon', 'darkkhaki', 'darkgreen', 'darkcyan', 'blue',
-            'seagreen', 'darkturquoise', 'mediumpurple'
-        ]
-
-        i = 0
-        for (T, C, A) in schedule:
-            if not (C in map_courses_idx):
-                if i > len(colormap):
-                    raise Exception("too many colours")
-                
-                map_courses_idx[C] = i
-                i += 1
-
-        for t in self.T:
-            map_start[t] = self.t_start + (t % self.timeslots_per_day)
-            map_end[t] = self.t_start + (t % self.timeslots_per_day) + 1
-
-        # create .txt calendar and fill events entry by entry
-        current_course = None
-        current_room = None
-        t_s = None 
-        t_f = None
-        with open(fname := f"./timetables/{name}_{by}_{id}.txt", 'w') as f:
-            for (T, C, A) in schedule:
-                # base case: current_course and current_room is different from the currently iterated one
-                # write:
-                # - name
-                # - day
-                if current_course != C or current_room != A or T - t_f > 1:
-                    if current_course != None or current_room != None:
-                        f.write(f"{str(map_start[t_s]).zfill(2)}:00 - {str(map_end[t_f]).zfill(2)}:00\n")
-                        f.write(f"{colormap[map_courses_idx[current_course]]}\n")
-                        f.write("\n")
-
-                    t_s = T
-                    t_f = T
-                    current_course = C
-                    current_room = A 
-                    day_i = (T // self.timeslots_per_day)
-                    day = self.days[day_i][:3]
-
-                    f.write(f"{courses_name[C]} [{rooms_name[A]}]\n")
-                    f.write(f"{day}\n")
-                else:
-                    t_f = T
+        plotEvents(events, earliest, latest, title)
+        plt.show()
 
-            else:
-                    t_f = T
+    def draw_calendars(self, name: str, by: Optional[Literal['cds', 'prof', 'course', 'room']] = None, processes = None):
+        """Render the calendars of every CdS, professor, room and course (or only those of one kind) to PNG files in
+        ./timetables/, named as in .draw_calendar(). The schedule is read once, the events are built in memory and the
+        rendering is spread over a process pool, where every worker reuses a single figure for its calendars.
+        Input:
+            name (str): prefix of the files
+            by (str): kind of calendars to render, None for all of them
+            processes (int): size of the pool, defaults to the number of CPUs
+        Output: list of the paths of the images"""
+        if not self.check():
+            return -1
 
-                    f.write(f"{str(map_start[t_s]).zfill(2)}:00 - {str(map_end[t_f]).zfill(2)}:00\n")
-                    f.write(f"{colormap[map_courses_idx[C]]}\n")
-                    f.write("\n")
+        frame = self.schedule_frame()
+        jobs = []
+        for kind in ([by] if by is not None else list(VIEWS)):
+            for id in sorted(frame[VIEWS[kind]].dropna().unique()):
+                (events, earliest, latest, title) = self.calendar_events(kind, id, frame)
+                jobs.append((f"./timetables/{name}_{kind}_{id}.png", events, earliest, latest, title))
 
-        
-        if by == 'cds':
-            plotSchedule(fname, f"Course in {cds_name[id]}")
-        if by == 'prof':
-            plotSchedule(fname, f"Prof. {prof_name[id]}")
-        if by == 'course':
-            plotSchedule(fname, f"Lectures for {courses_name[id]}")
-        if by == 'room':
-            plotSchedule(fname, f"Room {rooms_name[id]}")
+        processes = max(1, min(processes or os.cpu_count() or 1, len(jobs)))
+        chunks = [jobs[i::processes] for i in range(processes)]
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            paths = [path for chunk in pool.map(renderSchedules, chunks) for path in chunk]
 
+        self.emit('calendars', f"{len(paths)} calendars saved in ./timetables/", paths=paths)
+        return paths
 
     def check(self):
         """Verify if the database has been initialized before proceeding."""
         if not self.started:
-            print("[ERROR] Database not started yet. Please call the .start() method.")
+            self.emit('error', "[ERROR] Database not started yet. Please call the .start() method.")
             return False
         return True
\ No newline at end of file
@@ -3,7 +3,33 @@ File containing SQL statements for retrieving necessary data from the database
 """
 
 import sqlite3 as sq3
+import pandas as pd
 from typing import Dict, List, Literal
+from instance import Instance
+
+SCHEDULE_DDL = """
+    CREATE TABLE IF NOT EXISTS SCHEDULE(
+                    Timeslot INTEGER,
+                    Session INTEGER,
+                    Room INTEGER,
+                    FOREIGN KEY (Session) REFERENCES Session(IDSession),
+                    FOREIGN KEY (Room) REFERENCES Rooms(IDRoom),
+                    PRIMARY KEY(Timeslot, Session, Room)
+                    );
+"""
+
+# timetable of every week of a term (see TimetableScheduler.solve_term), the timeslots are those of the week
+TERM_SCHEDULE_DDL = """
+    CREATE TABLE IF NOT EXISTS TERM_SCHEDULE(
+                    Week INTEGER,
+                    Timeslot INTEGER,
+                    Session INTEGER,
+                    Room INTEGER,
+                    FOREIGN KEY (Session) REFERENCES Session(IDSession),
+                    FOREIGN KEY (Room) REFERENCES Rooms(IDRoom),
+                    PRIMARY KEY(Week, Timeslot, Session, Room)
+                    );
+"""
 
 class SQLUtility():
     def __init__(self, fname):
@@ -11,11 +37,17 @@ class SQLUtility():
         Input: fname (str) – database filename without extension."""
         self.fname = fname 
         self.con = None
+        self.queries = 0 # SQL statements issued since .start()
+
+    def count(self, statement):
+        """Trace callback of the connection: count the statements executed."""
+        self.queries += 1
 
     def start(self):
         """Connect to the database and create required tables if they do not exist."""
 
         self.con = sq3.connect(f"./databases/{self.fname}.db")
+        self.con.set_trace_callback(self.count)
 
         TABLE_DDLS = {
             "Professor": """
@@ -60,9 +92,36 @@ class SQLUtility():
                     Capacity INTEGER,
                     Name     TEXT
                 );
+            """,
+            # availability calendars: the hours (Day 0-5 from Monday, Hour the clock hour it starts at) in which a
+            # professor, a room or a CdS cannot have lectures
+            "ProfessorUnavailability": """
+                CREATE TABLE ProfessorUnavailability (
+                    IDProfessor INTEGER REFERENCES Professor(IDProfessor),
+                    Day         INTEGER,
+                    Hour        INTEGER,
+                    PRIMARY KEY (IDProfessor, Day, Hour)
+                );
+            """,
+            "RoomUnavailability": """
+                CREATE TABLE RoomUnavailability (
+                    IDRoom INTEGER REFERENCES Rooms(IDRoom),
+                    Day    INTEGER,
+                    Hour   INTEGER,
+                    PRIMARY KEY (IDRoom, Day, Hour)
+                );
+            """,
+            "CdSUnavailability": """
+                CREATE TABLE CdSUnavailability (
+                    IDCdS INTEGER REFERENCES CdS(IDCdS),
+                    Day   INTEGER,
+                    Hour  INTEGER,
+                    PRIMARY KEY (IDCdS, Day, Hour)
+                );
             """
             }
-        for table_name in ["Professor", "Courses", "Session", "CdS", "CourseCdS", "Rooms"]:
+        for table_name in ["Professor", "Courses", "Session", "CdS", "CourseCdS", "Rooms",
+                           "ProfessorUnavailability", "RoomUnavailability", "CdSUnavailability"]:
             try:
                 self.con.execute(f"SELECT 1 FROM {table_name} LIMIT 1;")
             except sq3.OperationalError as e:
@@ -222,6 +281,40 @@ class SQLUtility():
 
         return RETDICT
     
+    def load_instance(self) -> Instance:
+        """Read all the tables needed by the model in one pass and return them as an immutable Instance.
+        Input: None
+        Output: Instance"""
+
+        self.check()
+
+        sessions = {i[0]: (i[1], i[2]) for i in self.con.execute("SELECT IDSession, Hours, IDCourse FROM Session;").fetchall()}
+        courses = {i[0]: i[1] for i in self.con.execute("SELECT IDCourse, IDProfessor FROM Courses;").fetchall()}
+        professors = [i[0] for i in self.con.execute("SELECT IDProfessor FROM Professor;").fetchall()]
+        cds = {i[0]: i[1] for i in self.con.execute("SELECT IDCdS, NumStudents FROM CdS;").fetchall()}
+        course_cds = self.con.execute("SELECT IDCourse, IDCdS FROM CourseCdS;").fetchall()
+        rooms = {i[0]: i[1] for i in self.con.execute("SELECT IDRoom, Capacity FROM Rooms;").fetchall()}
+        unavailable = {
+            'P': self.con.execute("SELECT IDProfessor, Day, Hour FROM ProfessorUnavailability;").fetchall(),
+            'R': self.con.execute("SELECT IDRoom, Day, Hour FROM RoomUnavailability;").fetchall(),
+            'K': self.con.execute("SELECT IDCdS, Day, Hour FROM CdSUnavailability;").fetchall(),
+        }
+
+        return Instance.build(sessions, courses, professors, cds, course_cds, rooms, unavailable)
+
+    def get_preferences(self) -> Dict:
+        """Return the weights of the soft constraints stored in the optional Preferences table.
+        Input: None
+        Output: dictionary mapping preference names to weights (empty if the table does not exist)"""
+
+        self.check()
+
+        try:
+            query = self.con.execute("SELECT Name, Weight FROM Preferences;")
+        except sq3.OperationalError:
+            return {}
+        return {i[0]: i[1] for i in query.fetchall()}
+
     def get_class_name(self, cds) -> str:
         """Return the name of a class (CdS) given its ID.
         Input: cds (int)
@@ -291,6 +384,51 @@ class SQLUtility():
                                  """)
         return query.fetchall()
     
+    def get_schedule_entries(self) -> List:
+        """Return the raw rows of the schedule table (empty if there is no schedule yet).
+        Input: None
+        Output: list of (timeslot, session ID, room ID) tuples"""
+
+        self.check()
+
+        try:
+            query = self.con.execute("SELECT Timeslot, Session, Room FROM SCHEDULE ORDER BY Timeslot ASC;")
+        except sq3.OperationalError:
+            return []
+        return query.fetchall()
+    
+    def get_schedule_frame(self) -> pd.DataFrame:
+        """Return the schedule joined with sessions, courses, professors, CdS and rooms, loaded in a single query.
+        Input: None
+        Output: DataFrame with one row per (timeslot, session, room, CdS) and the columns Timeslot, Session, Room, RoomName,
+        Course, CourseName, Professor, ProfessorName, CdS, CdSName (CdS is missing for courses without a CdS); empty if
+        there is no schedule yet"""
+
+        self.check()
+
+        try:
+            frame = pd.read_sql_query("""
+                SELECT  SC.Timeslot, SC.Session, SC.Room, R.Name AS RoomName,
+                        C.IDCourse AS Course, C.Name AS CourseName,
+                        P.IDProfessor AS Professor, P.Name AS ProfessorName,
+                        K.IDCdS AS CdS, K.NameCdS AS CdSName
+                FROM    SCHEDULE SC
+                        JOIN Rooms R ON R.IDRoom = SC.Room
+                        JOIN Session S ON S.IDSession = SC.Session
+                        JOIN Courses C ON C.IDCourse = S.IDCourse
+                        LEFT JOIN Professor P ON P.IDProfessor = C.IDProfessor
+                        LEFT JOIN CourseCdS CC ON CC.IDCourse = C.IDCourse
+                        LEFT JOIN CdS K ON K.IDCdS = CC.IDCdS
+                ORDER BY SC.Timeslot, SC.Session, SC.Room, K.IDCdS;
+            """, self.con)
+        except pd.errors.DatabaseError:
+            frame = pd.DataFrame(columns=['Timeslot', 'Session', 'Room', 'RoomName', 'Course', 'CourseName',
+                                          'Professor', 'ProfessorName', 'CdS', 'CdSName'])
+
+        return frame.astype({'Timeslot': 'int64', 'Session': 'int64', 'Room': 'int64', 'Course': 'int64',
+                             'Professor': 'Int64', 'CdS': 'Int64', 'RoomName': 'string', 'CourseName': 'string',
+                             'ProfessorName': 'string', 'CdSName': 'string'})
+
     def get_schedule_subset(self, by: Literal['cds', 'prof', 'course', 'room'], id: int):
         """Return a filtered schedule based on CdS, professor, course, or room ID.
         Input: by (str), id (int)
@@ -370,30 +508,68 @@ class SQLUtility():
     
 
     def create_schedule(self):
-        """Create or reset the schedule table in the database."""
+        """Create the schedule table if needed and empty it."""
+
+        self.check()
+
+        self.con.execute(SCHEDULE_DDL)
+        self.con.execute("DELETE FROM SCHEDULE;")
+        self.con.commit()
+
+    def save_schedule(self, rows):
+        """Replace the content of the schedule table with the given rows, in a single transaction: on failure the previous
+        schedule is left untouched.
+        Input:
+            rows (Iterable[Tuple[int, int, int]]): (session ID, timeslot, room ID) triples
+        """
 
         self.check()
 
+        self.con.execute(SCHEDULE_DDL)
+        self.con.commit()
         try:
-            self.con.execute("DELETE FROM SCHEDULE WHERE 1=1;")
-            self.con.execute("DROP TABLE SCHEDULE;")
+            self.con.execute("BEGIN;")
+            self.con.execute("DELETE FROM SCHEDULE;")
+            self.con.executemany("INSERT INTO SCHEDULE VALUES (?, ?, ?);", ((T, S, A) for (S, T, A) in rows))
             self.con.commit()
         except:
-            pass
-
-        self.con.execute("""
-            CREATE TABLE SCHEDULE(
-                            Timeslot INTEGER,
-                            Session INTEGER,
-                            Room INTEGER,
-                            FOREIGN KEY (Session) REFERENCES Session(IDSession),
-                            FOREIGN KEY (Room) REFERENCES Rooms(IDRoom),
-                            PRIMARY KEY(Timeslot, Session, Room)
-                            );
-        """)
-
-        self.con.execute("DELETE FROM SCHEDULE WHERE 1=1;")
+            self.con.rollback()
+            raise
+
+    def save_term_schedule(self, rows):
+        """Replace the content of the term schedule table with the given rows, in a single transaction.
+        Input:
+            rows (Iterable[Tuple[int, int, int, int]]): (week, session ID, timeslot, room ID) quadruples
+        """
+
+        self.check()
+
+        self.con.execute(TERM_SCHEDULE_DDL)
         self.con.commit()
+        try:
+            self.con.execute("BEGIN;")
+            self.con.execute("DELETE FROM TERM_SCHEDULE;")
+            self.con.executemany("INSERT INTO TERM_SCHEDULE VALUES (?, ?, ?, ?);", ((W, T, S, A) for (W, S, T, A) in rows))
+            self.con.commit()
+        except:
+            self.con.rollback()
+            raise
+
+    def get_term_schedule_entries(self, week = None) -> List:
+        """Return the raw rows of the term schedule table, for one week or for all of them (empty if there is none yet).
+        Input: week (int): week of the term, None for all the weeks
+        Output: list of (week, timeslot, session ID, room ID) tuples"""
+
+        self.check()
+
+        try:
+            if week is None:
+                query = self.con.execute("SELECT Week, Timeslot, Session, Room FROM TERM_SCHEDULE ORDER BY Week ASC, Timeslot ASC;")
+            else:
+                query = self.con.execute("SELECT Week, Timeslot, Session, Room FROM TERM_SCHEDULE WHERE Week = ? ORDER BY Timeslot ASC;", (week,))
+        except sq3.OperationalError:
+            return []
+        return query.fetchall()
 
     def insert_entry(self, S, T, A):
         """Insert a new entry into the schedule table.
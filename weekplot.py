@@ -11,6 +11,17 @@ from textwrap import wrap
 
 DAYS = ['Monday','Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
+# colours of the courses in a calendar
+COLORMAP = [
+    'gray', 'sienna', 'lightgoldenrodyellow', 'mediumspringgreen', 'deepskyblue', 'darkorchid',
+    'silver', 'sandybrown', 'olivedrab', 'lightseagreen', 'aliceblue', 'plum',
+    'rosybrown', 'bisque', 'olivedrab', 'lightseagreen', 'slategray', 'mediumvioletred',
+    'firebrick', 'moccasin', 'chartreuse', 'paleturquoise', 'royalblue', 'palevioletred',
+    'red', 'gold', 'palegreen', 'paleturquoise', 'navy', 
+    'darksalmon', 'darkkhaki', 'darkgreen', 'darkcyan', 'blue',
+    'seagreen', 'darkturquoise', 'mediumpurple'
+]
+
 @dataclass
 class Event:
     name: str 
@@ -81,31 +92,27 @@ def parseTxt(fname):
             raise UserWarning("Invalid text input format.")
     return events, earliest, latest + 1
 
-def plotEvent(e, label_list): #TODO: REMOVE LABEL LIST
+def plotEvent(e, label_list, ax = None): #TODO: REMOVE LABEL LIST
+    ax = ax or plt.gca()
     for day in e.days:
         d = DAYS.index(day) + 0.52
         start = float(e.startH) + float(e.startM) / 60
         end = float(e.endH) + float(e.endM) / 60
 
-        plt.fill_between([d, d+0.96], [start, start], [end, end], color=e.color)
-        plt.text(d + 0.02, start + 0.02, '{0}:{1:0>2}'.format(e.startH, e.startM), va='top', fontsize=8, wrap=True)
-        plt.text(d + 0.48, (start + end) * 0.502, '\n'.join(wrap(e.name, 30)), ha='center', va='center', fontsize=8, wrap=True)
+        ax.fill_between([d, d+0.96], [start, start], [end, end], color=e.color)
+        ax.text(d + 0.02, start + 0.02, '{0}:{1:0>2}'.format(e.startH, e.startM), va='top', fontsize=8, wrap=True)
+        ax.text(d + 0.48, (start + end) * 0.502, '\n'.join(wrap(e.name, 30)), ha='center', va='center', fontsize=8, wrap=True)
 
-def plotSchedule(fname, title):
-    try:
-        open(fname)
-    except:
-        raise Exception("FILE NOT FOUND")
-    
-    events, earliest, latest = parseTxt(fname)    
-    
-    label_list = []
+def plotEvents(events, earliest, latest, title, ax = None):
+    # draw the calendar on ax (a new figure if not given), the events being already in memory
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(18, 9))
 
-    fig, ax = plt.subplots(figsize=(18, 9))
+    label_list = []
     for e in events:
-        plotEvent(e, label_list)
+        plotEvent(e, label_list, ax)
 
-    plt.title(f'Weekly Schedule of {title}', y=1, fontsize=14)
+    ax.set_title(f'Weekly Schedule of {title}', y=1, fontsize=14)
 
     ax.set_xlim(0.5, len(DAYS) + 0.5)
     ax.set_xticks(range(1, len(DAYS) + 1))
@@ -114,5 +121,29 @@ def plotSchedule(fname, title):
     ax.set_yticks(range(ceil(earliest), ceil(latest)))
     ax.set_yticklabels(["{0}:00".format(h) for h in range(ceil(earliest), ceil(latest))])
     ax.grid(axis='y', linestyle='--', linewidth=0.5)
+    return ax
 
-    plt.show()
\ No newline at end of file
+def plotSchedule(fname, title):
+    try:
+        open(fname)
+    except:
+        raise Exception("FILE NOT FOUND")
+    
+    events, earliest, latest = parseTxt(fname)    
+    plotEvents(events, earliest, latest, title)
+
+    plt.show()
+
+def renderSchedules(jobs):
+    # render (path, events, earliest, latest, title) jobs to image files, reusing a single figure
+    # (run in the worker processes of TimetableScheduler.draw_calendars, hence the non-interactive backend)
+    plt.switch_backend('Agg')
+    fig, ax = plt.subplots(figsize=(18, 9))
+    paths = []
+    for (path, events, earliest, latest, title) in jobs:
+        ax.clear()
+        plotEvents(events, earliest, latest, title, ax)
+        fig.savefig(path)
+        paths.append(path)
+    plt.close(fig)
+    return paths
\ No newline at end of file